@@ -0,0 +1,37 @@
+'''
+Checksum microbenchmark across packet sizes
+
+    python benchmarks/bench_checksum.py
+'''
+import os
+import timeit
+
+
+from litex.novitus.helpers import xor
+
+
+def xor_loop(data, chk=0):
+    for el in data:
+        chk ^= el
+
+    return chk
+
+
+def main(number=2000):
+    for size in (16, 64, 256, 1024, 4096, 16384):
+        data = os.urandom(size)
+        results = []
+
+        for name, func in (('loop', xor_loop), ('xor', xor)):
+            elapsed = min(timeit.repeat(
+                lambda: func(data, 255),
+                number=number,
+                repeat=5
+            ))
+            results.append('{} {:9.2f} us'.format(name, elapsed / number * 1e6))
+
+        print('{:6} bytes: {}'.format(size, '  '.join(results)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+'''
+Packet text encoding benchmark
+
+Compares str.encode through the codec registry with the encoder() fast
+path, for mazovia and cp1250, on ASCII and Polish texts.
+
+    python benchmarks/bench_codec.py
+'''
+import timeit
+
+
+from litex.novitus.helpers import encoder
+
+
+TEXTS = {
+    'ascii': 'Test product\r2.00\rA/4.99/9.98/' * 4,
+    'polish': 'Zażółć gęślą jaźń\r2.00\rA/4.99/9.98/' * 4
+}
+
+
+def main(number=100000):
+    for encoding in ('mazovia', 'cp1250'):
+        fast = encoder(encoding)
+
+        for kind, txt in TEXTS.items():
+            results = []
+
+            for name, func in (
+                ('str.encode', lambda: txt.encode(encoding)),
+                ('encoder', lambda: fast(txt))
+            ):
+                elapsed = min(timeit.repeat(func, number=number, repeat=5))
+                results.append('{} {:8.1f} MB/s'.format(
+                    name, len(txt) * number / elapsed / 1e6
+                ))
+
+            print('{:8} {:7} {}'.format(encoding, kind, '  '.join(results)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+'''
+Report layout benchmark
+
+Times rendering a 500 row table report, first (uncached) and repeated
+(rows and texts served from the caches).
+
+    python benchmarks/bench_layout.py
+'''
+import time
+
+
+from litex.novitus.layout import Layout, printable, wrap, _row
+
+
+ROWS = [
+    ('Zamówienie {} zażółć gęślą jaźń'.format(no % 50), no % 7 + 1, '{:.2f}'.format(no * 1.5))
+    for no in range(500)
+]
+
+
+def report(layout):
+    lines = layout.text('Raport zmiany nr 12', align='^')
+    lines.append(layout.rule())
+    lines += layout.table(ROWS, aligns='<>>', header=('Towar', 'Ilość', 'Wartość'))
+    return lines
+
+
+def main():
+    layout = Layout()
+
+    for cache in (printable, wrap, _row):
+        cache.cache_clear()
+
+    for name in ('first', 'cached'):
+        start = time.perf_counter()
+        lines = report(layout)
+        elapsed = time.perf_counter() - start
+        print('{:7} {:7.2f} ms  {:5} lines'.format(name, elapsed * 1e3, len(lines)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+'''
+Amount formatting benchmark
+
+Compares the Decimal based nmb (cached per value) with plain float
+formatting, for the amounts of a typical receipt.
+
+    python benchmarks/bench_money.py
+'''
+import timeit
+
+
+from litex.novitus.helpers import nmb, money, item_value
+
+
+AMOUNTS = [4.99, 2, 0.5, 19.99, 2.675, 100, 12.3, 7.49]
+
+
+def nmb_float(val):
+    return '{:.2f}'.format(val)
+
+
+def main(number=100000):
+    for name, func in (
+        ('float format', lambda: [nmb_float(val) for val in AMOUNTS]),
+        ('money', lambda: [str(money(val)) for val in AMOUNTS]),
+        ('nmb', lambda: [nmb(val) for val in AMOUNTS]),
+        ('item_value', lambda: [nmb(item_value(val, 3)) for val in AMOUNTS])
+    ):
+        elapsed = min(timeit.repeat(func, number=number, repeat=5))
+        print('{:14} {:6.2f} us/amount'.format(
+            name, elapsed / number / len(AMOUNTS) * 1e6
+        ))
+
+
+if __name__ == '__main__':
+    main()
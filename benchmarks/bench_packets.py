@@ -0,0 +1,63 @@
+'''
+Packet assembly microbenchmark
+
+Compares assembling receipt line packets with the cached templates
+against encoding and checksumming the whole packet on every call.
+
+    python benchmarks/bench_packets.py
+'''
+import timeit
+
+
+from litex.novitus import commands
+from litex.novitus.helpers import assemble_packet, checksum
+
+
+def assemble_packet_uncached(command, parameters=tuple(), texts=tuple(), encoding='mazovia'):
+    txt = ''.join(parameters)
+    txt += command
+    txt += ''.join(texts)
+
+    pkt = txt.encode(encoding)
+
+    return b'\x1bP' + pkt + checksum(pkt, encoding) + b'\x1b\\'
+
+
+RECEIPT = [
+    commands.item(
+        line_no=line_no,
+        name='Test zażółć gęślą jaźń',
+        quantity=2,
+        ptu='A',
+        price=4.99
+    )
+    for line_no in range(1, 41)
+] + [
+    commands.payment_add('card', 199.6),
+    commands.receipt_close(199.6, 'John Doe')
+]
+
+
+def receipt_packets(assemble, encoding):
+    for cmd in RECEIPT:
+        assemble(cmd.command, cmd.parameters, cmd.texts, encoding)
+
+
+def main(number=500):
+    for encoding in ('mazovia', 'cp1250'):
+        for name, assemble in (
+            ('uncached', assemble_packet_uncached),
+            ('templates', assemble_packet)
+        ):
+            elapsed = min(timeit.repeat(
+                lambda: receipt_packets(assemble, encoding),
+                number=number,
+                repeat=5
+            ))
+            print('{:8} {:10} {:8.2f} us/packet'.format(
+                encoding, name, elapsed / number / len(RECEIPT) * 1e6
+            ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+'''
+Printer throughput benchmark against the emulator
+
+Measures receipts per second, per line latency and CPU time per packet
+of the Printer methods, batch mode and prepared documents, with the
+emulator answering over a local TCP socket.
+
+    python benchmarks/bench_printer.py [line latency in ms]
+'''
+import sys
+import time
+
+
+from litex.novitus import Printer, Receipt
+from litex.novitus.emulator import Emulator, TCPTransport
+
+
+LINES = 40
+RECEIPTS = 20
+
+
+def receipt_by_methods(printer):
+    printer.receipt_begin(system_identifier='1/BENCH')
+    for line_no in range(1, LINES + 1):
+        printer.item(line_no=line_no, name='Test zażółć gęślą jaźń', quantity=2, ptu='A', price=4.99)
+    printer.receipt_close(LINES * 9.98, 'John Doe')
+
+
+def receipt_in_batch(printer):
+    with printer.batch():
+        receipt_by_methods(printer)
+
+
+def receipt_as_document(printer):
+    receipt = Receipt(system_identifier='1/BENCH')
+    for _ in range(LINES):
+        receipt.item(name='Test zażółć gęślą jaźń', quantity=2, ptu='A', price=4.99)
+    printer.print_document(receipt.close(cashier='John Doe'))
+
+
+def main(line_latency=0.0):
+    emulator = Emulator(latency={'$l': line_latency})
+
+    with TCPTransport(emulator) as transport:
+        printer = Printer(transport.url, encoding='cp1250')
+
+        for name, run in (
+            ('methods', receipt_by_methods),
+            ('batch', receipt_in_batch),
+            ('document', receipt_as_document)
+        ):
+            printer.latencies.clear()
+            packets = emulator.packets
+            wall, cpu = time.perf_counter(), time.process_time()
+
+            for _ in range(RECEIPTS):
+                run(printer)
+
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            packets = emulator.packets - packets
+            line = printer.latency_report()['$l']
+
+            print('{:9} {:7.1f} receipts/s  {:7.3f} ms/line  {:6.1f} us CPU/packet'.format(
+                name,
+                RECEIPTS / wall,
+                line['avg'] * 1e3,
+                cpu / packets * 1e6
+            ))
+
+        printer.close()
+
+
+if __name__ == '__main__':
+    main(float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.0)
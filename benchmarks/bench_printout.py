@@ -0,0 +1,53 @@
+'''
+Non-fiscal printout throughput benchmark against the emulator
+
+Compares printing a long printout with a non_fiscal_printout_line call
+per line against streaming it with non_fiscal_printout.
+
+    python benchmarks/bench_printout.py [line latency in ms]
+'''
+import sys
+import time
+
+
+from litex.novitus import Printer
+from litex.novitus.emulator import Emulator, TCPTransport
+
+
+LINES = 2000
+
+
+def lines():
+    for line_no in range(LINES):
+        yield 'Order {:5}  Zażółć gęślą jaźń  {:8.2f}'.format(line_no, line_no * 1.5)
+
+
+def by_lines(printer):
+    printer.non_fiscal_printout_begin(printout_no=200)
+    for line in lines():
+        printer.non_fiscal_printout_line([line], printout_no=200, line_no=1)
+    printer.non_fiscal_printout_close(printout_no=200)
+
+
+def streamed(printer):
+    printer.non_fiscal_printout(lines(), printout_no=200, line_no=1)
+
+
+def main(line_latency=0.0):
+    emulator = Emulator(latency={'$w': line_latency})
+
+    with TCPTransport(emulator) as transport:
+        printer = Printer(transport.url, encoding='cp1250')
+
+        for name, run in (('lines', by_lines), ('streamed', streamed)):
+            wall = time.perf_counter()
+            run(printer)
+            wall = time.perf_counter() - wall
+
+            print('{:9} {:9.0f} lines/s'.format(name, LINES / wall))
+
+        printer.close()
+
+
+if __name__ == '__main__':
+    main(float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.0)
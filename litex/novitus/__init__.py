@@ -1,3 +1,9 @@
 from .printer import Printer
+from .receipt import Receipt, Invoice
+from .pool import PrinterPool
+from .replies import CashRegisterData, RawReply, register_reply
 from .helpers import unpack_flags, yn, nmb, assemble_packet, parse_cash_register_data_reply, parse_ptu_percentages
-from .exceptions import CommunicationError, ProtocolError, ReplyNotImplemented
\ No newline at end of file
+from .exceptions import (
+    CommunicationError, CommunicationTimeout, ProtocolError, ReplyNotImplemented, BatchError,
+    ValidationError
+)
\ No newline at end of file
@@ -0,0 +1,230 @@
+'''
+asyncio Novitus Protocol implementation
+
+socket:// urls are served by asyncio streams, other urls need
+pyserial-asyncio (pip install litex.novitus[asyncio]).
+'''
+import asyncio
+import functools
+import logging
+from urllib.parse import urlsplit
+
+
+from . import commands, validation
+from .helpers import (
+    assemble_packet, parse_dle_status, parse_enq_status, parse_error_reply,
+    parse_cash_register_data_reply, parse_taxrates
+)
+from .exceptions import CommunicationError, CommunicationTimeout, ProtocolError
+from .printer import ERROR_HANDLING
+
+
+log = logging.getLogger(__name__)
+
+
+async def open_connection(url):
+    '''Open (reader, writer) streams for a pyserial style url'''
+    parts = urlsplit(url)
+
+    if parts.scheme == 'socket':
+        return await asyncio.open_connection(parts.hostname, parts.port)
+
+    try:
+        import serial_asyncio
+    except ImportError:
+        raise CommunicationError(
+            'pyserial-asyncio is required for {} urls'.format(parts.scheme or 'serial')
+        )
+
+    return await serial_asyncio.open_serial_connection(url=url)
+
+
+def _command(build, validate=None):
+    '''AsyncPrinter coroutine sending the packet built by a commands function'''
+    @functools.wraps(build)
+    async def method(self, *args, **kwargs):
+        if validate is not None and self.validate:
+            validate(*args, encoding=self.encoding, **kwargs)
+
+        await self.execute(build(*args, **kwargs))
+
+    return method
+
+
+class AsyncPrinter:
+
+    def __init__(self, url, timeout=10, encoding='mazovia', validate=True):
+        self.url = url
+        self.timeout = timeout
+        self.encoding = encoding
+        self.validate = validate
+        self._reader = None
+        self._writer = None
+        self._lock_instance = None
+
+    @property
+    def _lock(self):
+        # created on first use: before Python 3.10 a lock is bound to the
+        # event loop current at its creation
+        if self._lock_instance is None:
+            self._lock_instance = asyncio.Lock()
+
+        return self._lock_instance
+
+    async def connect(self):
+        if self._writer is None:
+            self._reader, self._writer = await open_connection(self.url)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._reader = self._writer = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _write(self, data):
+        await self.connect()
+
+        try:
+            self._writer.write(data)
+            await self._writer.drain()
+        except OSError as exc:
+            self._abort()
+            raise CommunicationError('Connection lost: {}'.format(exc)) from exc
+
+    def _abort(self):
+        '''Drop the connection, so a late reply is not read as the next one'''
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = self._writer = None
+
+    async def _read(self, coro):
+        try:
+            return await asyncio.wait_for(coro, self.timeout)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+            self._abort()
+            raise CommunicationTimeout('No reply from printer')
+
+    async def _read_status(self, ctrl):
+        await self._write(ctrl)
+        return await self._read(self._reader.readexactly(1))
+
+    async def _send_command(self, command, parameters, texts, read_reply, check_for_errors):
+        pkt = assemble_packet(command, parameters, texts, self.encoding)
+
+        log.debug('Sending command: %s', pkt)
+        await self._write(pkt)
+
+        if read_reply:
+            reply = await self._read(self._reader.readuntil(b'\x1b\\'))
+            log.debug('Received reply: %s', reply)
+        else:
+            reply = None
+
+        if check_for_errors:
+            status = parse_enq_status(await self._read_status(b'\x05'))
+            if status['lastcommanderror'] == 'yes':
+                err = parse_error_reply(
+                    await self._send_command('#n', (), (), True, False)
+                )
+                if err != 0:
+                    raise ProtocolError(err)
+
+        return reply
+
+    async def send_command(
+        self,
+        command,
+        parameters=tuple(),
+        texts=tuple(),
+        read_reply=False,
+        check_for_errors=False
+    ):
+        async with self._lock:
+            return await self._send_command(
+                command, parameters, texts, read_reply, check_for_errors
+            )
+
+    async def execute(self, cmd):
+        async with self._lock:
+            return await self._execute(cmd)
+
+    async def _execute(self, cmd):
+        return await self._send_command(
+            cmd.command, cmd.parameters, cmd.texts, False, cmd.check_for_errors
+        )
+
+    async def print_document(self, document):
+        '''Print a transaction, no other command is interleaved with it'''
+        async with self._lock:
+            for cmd in document.commands():
+                await self._execute(cmd)
+
+    async def dle(self):
+        async with self._lock:
+            return parse_dle_status(await self._read_status(b'\x10'))
+
+    async def enq(self):
+        async with self._lock:
+            return parse_enq_status(await self._read_status(b'\x05'))
+
+    async def bel(self):
+        async with self._lock:
+            await self._write(b'\x07')
+
+    async def can(self):
+        async with self._lock:
+            await self._write(b'\x18')
+
+    async def set_error(self, value):
+        await self.send_command(
+            command='#e',
+            parameters=[ERROR_HANDLING[value]]
+        )
+
+    async def get_error(self):
+        reply = await self.send_command(
+            command='#n',
+            read_reply=True
+        )
+
+        return parse_error_reply(reply)
+
+    async def cash_register_data(self, mode=21, strict=True):
+        '''
+        Cash register data (#s) in the given mode, parsed by the reply type
+
+        Reply types without a registered layout (see replies.register_reply)
+        raise ReplyNotImplemented, or give RawReply when strict is False.
+        '''
+        reply = await self.send_command(
+            command='#s',
+            parameters=[str(mode)],
+            read_reply=True
+        )
+
+        return parse_cash_register_data_reply(reply[2:-2], strict)
+
+    async def taxrates_get(self):
+        return parse_taxrates(await self.cash_register_data(mode=22), self.encoding)
+
+    invoice_begin = _command(commands.invoice_begin, validation.invoice_begin)
+    invoice_cancel = _command(commands.invoice_cancel)
+    invoice_close = _command(commands.invoice_close, validation.invoice_close)
+    item = _command(commands.item, validation.item)
+    discount = _command(commands.discount)
+    markup = _command(commands.markup)
+    payment_add = _command(commands.payment_add, validation.payment_add)
+    receipt_begin = _command(commands.receipt_begin)
+    receipt_cancel = _command(commands.receipt_cancel)
+    receipt_close = _command(commands.receipt_close, validation.receipt_close)
+    open_drawer = _command(commands.open_drawer)
+    non_fiscal_printout_begin = _command(commands.non_fiscal_printout_begin)
+    non_fiscal_printout_line = _command(commands.non_fiscal_printout_line)
+    non_fiscal_printout_close = _command(commands.non_fiscal_printout_close)
@@ -0,0 +1,459 @@
+'''
+Novitus Protocol commands
+
+Builders returning the command code, parameters and texts of a packet,
+shared by Printer and the transaction builders.
+'''
+from collections import namedtuple
+
+
+from .helpers import nmb, item_value
+
+
+BUYER_IDENTIFIER = {
+    'NIP': '1',
+    'REGON': '2',
+    'PESEL': '3'
+}
+
+PAYMENT_TYPES = {
+    'cash': '0',
+    'card': '1',
+    'cheque': '2',
+    'bon': '3',
+    'other': '4',
+    'credit': '5',
+    'account': '6',
+    'foreign': '7',
+    'transfer': '8',
+    'mobile': '9',
+    'voucher': '10'
+}
+
+
+Command = namedtuple(
+    'Command',
+    ['command', 'parameters', 'texts', 'check_for_errors'],
+    defaults=[tuple(), tuple(), True]
+)
+
+
+def invoice_begin(
+    no_of_lines,        
+    customer,
+    nip,
+    number,
+    invoice_type='invoice',
+    signarea=True,
+    copies=0,
+    payment_date=None,
+    margins=True,
+    recipient=None,
+    issuer=None
+):
+    customer_lines = customer.split('\n')
+
+    params = [
+        str(no_of_lines), # invoice lines number
+        ';',
+        str(len(customer_lines)), # customer lines number
+        ';',
+        '1' if invoice_type == 'invoice' else '2',
+        ';',
+        '2', # Oryginał / kopia
+        ';',
+        '1' if margins else '0', # upper margin
+        ';',
+        '0', # ignored
+        ';',
+        '255' if copies == 0 else str(copies - 1),
+        ';',
+        '0', # ignored
+        ';',
+        '0', # ignored
+        ';',
+        '0' if signarea else '1',
+        ';',
+        '0' # no country symbol before sellers NIP
+    ]
+
+    texts = [
+        number,
+        '\r',            
+    ]
+
+    for cl in customer_lines:
+        texts += [
+            cl,
+            '\r'
+        ]
+
+    texts += [
+        nip,
+        '\r', 
+        '\r', # payment date
+        '\r'  # payment form
+    ]
+
+    if payment_date is not None:
+        texts += [
+            payment_date,
+            '\r'
+        ]
+
+    if recipient is not None:
+        texts += [
+            recipient,
+            '\r'
+        ]
+
+    if issuer is not None:
+        texts += [
+            issuer,
+            '\r'
+        ]
+
+    texts += [
+        '#',
+        number,
+        '\r',
+        customer_lines[0],
+        '\r'
+    ]        
+
+    return Command(
+        command='$h',
+        parameters=params,
+        texts=texts
+    )
+
+
+def invoice_cancel():    
+    return Command(
+        command='$e',
+        parameters=['0']
+    )
+
+
+def invoice_close(
+    total, 
+    number,       
+    discount=0,
+    cash=0,
+    paid_line='',
+    buyer='',
+    seller=''
+):                
+    return Command(
+        command='$e',
+        parameters=[
+            '1', # action - 1 commit
+            ';',
+            str(round(discount, 2)), #'0' discount percentage - ignored
+            ';',
+            '0', # additional lines count
+            ';',
+            '1', # how to end transaction - ignored
+            ';',
+            '0', # discount type: 0 - none, 1 - precentage discount, 2 - percentage markup
+            ';',
+            '1', # constant
+            ';',
+            '1' if paid_line else '0',
+            ';',
+            '1' if buyer else '2',
+            ';',
+            '1' if seller else '2'
+        ],
+        texts=[
+            number,
+            '\r',
+            paid_line,
+            '\r',
+            buyer,
+            '\r',
+            seller,
+            '\r',                
+            nmb(cash),
+            '/',
+            nmb(total),
+            '/',
+            '0', # discount
+            '/'
+        ]
+    )
+
+
+def item(
+    line_no,    
+    name,
+    quantity,        
+    ptu,
+    price,
+    plu='',        
+    description='',
+    discount_name='',
+    discount_value=None,
+    discount_descid=16
+):
+    params = [str(line_no)]
+    texts = [name, '\r']
+
+    if plu:
+        texts += [plu, '\r']
+
+    texts += [
+        nmb(quantity),
+        '\r',
+        ptu,
+        '/',
+        nmb(price),
+        '/',
+        nmb(item_value(price, quantity)),
+        '/'
+    ]
+
+    if discount_value is not None:
+        params += [
+            ';',
+            '2' if discount_value.endswith('%') else '1',
+            ';', 
+            str(discount_descid)
+        ]
+
+        texts += [
+            discount_value.strip('%'),
+            '/',
+            discount_name,
+            '\r'
+        ]
+
+    if description:
+        if discount_value is None:
+            params.append(';0;0')                
+
+        params.append(';1')
+        texts += [description, '\r']
+    
+    return Command(
+        command='$l',
+        parameters=params,
+        texts=texts
+    )
+
+
+def discount(
+    value,
+    name
+):
+    if not isinstance(value, str):
+        value = nmb(value)
+
+    discount_type = '1' if value.endswith('%') else '3'
+
+    return Command(
+        command='$n',
+        parameters=[discount_type],
+        texts=[
+            name,
+            '\r',
+            value.strip('%'),
+            '/'
+        ]
+    )
+
+
+def markup(
+    value,
+    name
+):
+    if not isinstance(value, str):
+        value = nmb(value)
+
+    markup_type = '2' if value.endswith('%') else '4'
+
+    return Command(
+        command='$n',
+        parameters=[markup_type],
+        texts=[
+            name,
+            '\r',
+            value.strip('%'),
+            '/'
+        ]
+    )
+
+
+def payment_add(
+    type_,
+    value,
+    mode='payment',
+    name=''
+):
+    return Command(
+        command='$b',
+        parameters=[
+            '1' if mode == 'payment' else '2',
+            ';',
+            PAYMENT_TYPES.get(type_, '4'), # set other, when nothing matches
+        ],
+        texts=[
+            nmb(value),
+            '/',
+            name,
+            '\r'
+        ]
+    )
+
+
+def receipt_begin(
+    lines_count=0, # 0 - online
+    system_identifier='',
+    additional_lines=tuple(),
+    buyer_identifier='',
+    buyer_identifier_type='NIP'
+):
+
+    if system_identifier:
+        additional_lines = [
+            system_identifier
+        ] + list(additional_lines)
+
+    params = [
+        str(lines_count),
+        ';', 
+        str(len(additional_lines))
+    ]
+
+    texts = [line + '\r' for line in additional_lines]
+
+    if buyer_identifier:
+        params += [
+            ';0;',
+            BUYER_IDENTIFIER[buyer_identifier_type],
+            ';',
+            '1'
+        ]
+
+        texts += [
+            buyer_identifier,
+            '\r'
+        ]
+
+    return Command(
+        command='$h',
+        parameters=params,
+        texts=texts
+    )
+
+
+receipt_cancel = invoice_cancel
+
+
+def receipt_close(
+    total,        
+    cashier,
+    discount=0,
+    cash=0
+):                
+    return Command(
+        command='$e',
+        parameters=['1;0;0;1;1;1',],
+        texts=[
+            cashier,
+            '\r',
+            nmb(cash),
+            '/',
+            nmb(total),
+            '/',
+            nmb(discount),
+            '/'
+        ]
+    )
+
+
+def open_drawer():
+    return Command(
+        command='$d',
+        parameters=['1'],
+        check_for_errors=False
+    )
+
+
+def non_fiscal_printout_begin(
+    printout_no,
+    header_no=0,
+    options=0
+):
+    return Command(
+        command='$w',
+        parameters=[
+            '0', # constant
+            ';',
+            str(printout_no),
+            ';',
+            str(header_no),
+            ';',
+            str(options)
+        ]
+    )
+
+
+def non_fiscal_printout_line(
+    args,        
+    printout_no,
+    line_no=0,
+    bold=False,
+    inversed=False,
+    font=0,
+    centered=False,
+    font_attributes=0
+):
+    return Command(
+        command='$w',
+        parameters=[                
+            str(printout_no),
+            ';',
+            str(line_no),
+            ';',
+            '1' if bold else '0',
+            ';',
+            '1' if inversed else '0',
+            ';',
+            str(font),
+            ';',
+            '1' if centered else '0',
+            ';',
+            str(font_attributes)
+        ],
+        texts=[
+            arg + '\r' for arg in args
+        ]
+    )
+
+
+def non_fiscal_printout_close(
+    printout_no,
+    system_no='',  
+    additional_lines=tuple()
+):
+    args = list(additional_lines)
+
+    if system_no:
+        args.insert(0, system_no)
+        
+    return Command(
+        command='$w',
+        parameters=[
+            '1', # constant
+            ';',
+            str(printout_no),
+            ';',
+            '1' if system_no else '0',
+            ';',
+            str(len(additional_lines))
+        ],
+        texts=[
+            arg + '\r' for arg in args
+        ]
+    )
@@ -0,0 +1,349 @@
+'''
+Novitus printer emulator
+
+A software printer answering the DLE, ENQ, #n, #s, #e, $h, $l, $n, $b,
+$e, $d and $w subset of the protocol, with configurable per command
+latency and error injection. It is served over a local TCP socket
+(socket:// url) or a pseudo terminal, so Printer can be tested and
+benchmarked without hardware:
+
+    with TCPTransport(Emulator(latency={'$l': 0.01})) as transport:
+        printer = Printer(transport.url)
+'''
+import datetime
+import logging
+import os
+import re
+import socket
+import threading
+import time
+
+
+from .helpers import checksum, nmb, item_value
+
+
+log = logging.getLogger(__name__)
+
+
+FRAME_RE = re.compile(rb'^(?P<parameters>[\d;]*)(?P<command>[#$][a-z])(?P<texts>.*)$', re.S)
+ITEM_RE = re.compile(rb'(?P<quantity>[\d.]+)\r(?P<ptu>[A-G])/(?P<price>[\d.]+)/(?P<value>[\d.]+)/')
+
+TAX_RATES = ('23.00', '08.00', '05.00', '00.00', '100.00', '101.00', '101.00')
+
+# error codes (see exceptions.error_codes)
+INVALID_CHECKSUM = 2
+INVALID_VALUE = 20
+NOT_IN_TRANSACTION = 21
+WRONG_MODE = 1031
+UNKNOWN_COMMAND = 1022
+
+
+# Emulator methods handling the commands
+HANDLERS = {
+    '#n': 'get_error',
+    '#e': 'set_error',
+    '#s': 'cash_register_data',
+    '$h': 'transaction_begin',
+    '$l': 'item',
+    '$n': 'discount',
+    '$b': 'payment',
+    '$e': 'transaction_end',
+    '$d': 'open_drawer',
+    '$w': 'non_fiscal_printout'
+}
+
+
+class Emulator:
+    '''
+    Protocol state machine of a single printer
+
+    latency maps command codes ('$l', 'ENQ', 'DLE', ...) to seconds spent
+    processing them, with 'default' for the others. errors maps command
+    codes to the error code to report, or to callables receiving the packet
+    body and returning one (0 for success).
+    '''
+
+    def __init__(self, latency=None, errors=None, serialno='ABC1234567890', fiscal=True):
+        self.latency = dict(latency or {})
+        self.errors = dict(errors or {})
+        self.serialno = serialno
+        self.fiscal = fiscal
+        self.online = True
+        self.paper = True
+        self.error = 0
+        self.last_command_failed = False
+        self.in_transaction = False
+        self.last_transaction_correct = True
+        self.receipt_count = 0
+        self.lines = 0
+        self.packets = 0
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+
+    def handle(self, data):
+        '''Feed received bytes, return the reply bytes'''
+        with self._lock:
+            self._buffer += data
+            replies = bytearray()
+
+            while self._buffer:
+                if self._buffer.startswith(b'\x1bP'):
+                    end = self._buffer.find(b'\x1b\\')
+                    if end == -1:
+                        break
+                    pkt = bytes(self._buffer[2:end])
+                    del self._buffer[:end + 2]
+                    replies += self.handle_packet(pkt)
+                elif self._buffer[:1] == b'\x1b' and len(self._buffer) == 1:
+                    break
+                else:
+                    ctrl = bytes(self._buffer[:1])
+                    del self._buffer[:1]
+                    replies += self.handle_control(ctrl)
+
+            return bytes(replies)
+
+    def _delay(self, command):
+        delay = self.latency.get(command, self.latency.get('default', 0))
+        if delay:
+            time.sleep(delay)
+
+    def handle_control(self, ctrl):
+        if ctrl == b'\x10':
+            self._delay('DLE')
+            return bytes([
+                0x70
+                | (0x04 if self.online else 0)
+                | (0 if self.paper else 0x02)
+            ])
+        elif ctrl == b'\x05':
+            self._delay('ENQ')
+            return bytes([
+                0x60
+                | (0x08 if self.fiscal else 0)
+                | (0x04 if self.last_command_failed else 0)
+                | (0x02 if self.in_transaction else 0)
+                | (0x01 if self.last_transaction_correct else 0)
+            ])
+
+        # BEL, CAN and noise are ignored
+        return b''
+
+    def handle_packet(self, pkt):
+        self.packets += 1
+        body, chk = pkt[:-2], pkt[-2:]
+        match = FRAME_RE.match(body)
+        command = match.group('command').decode('ascii') if match else None
+
+        self._delay(command)
+
+        if match is None:
+            return self._fail(UNKNOWN_COMMAND)
+
+        if chk != checksum(body):
+            return self._fail(INVALID_CHECKSUM)
+
+        injected = self.errors.get(command, 0)
+        if callable(injected):
+            injected = injected(body)
+        if injected:
+            return self._fail(injected)
+
+        if command not in HANDLERS:
+            return self._fail(UNKNOWN_COMMAND)
+
+        error, reply = getattr(self, HANDLERS[command])(
+            match.group('parameters'),
+            match.group('texts')
+        )
+
+        if error:
+            return self._fail(error)
+
+        self.last_command_failed = False
+
+        return reply
+
+    def _fail(self, error):
+        log.debug('Emulated error %s', error)
+        self.error = error
+        self.last_command_failed = True
+        return b''
+
+    def _frame(self, body):
+        return b'\x1bP' + body + checksum(body) + b'\x1b\\'
+
+    def get_error(self, parameters, texts):
+        reply = b'\x1bP1#E' + str(self.error).encode('ascii') + b'\x1b\\'
+        self.error = 0
+        return 0, reply
+
+    def set_error(self, parameters, texts):
+        return 0, b''
+
+    def cash_register_data(self, parameters, texts):
+        body = '2#X{};{};{};{};1;{};{:%y;%m;%d}/{}/{}/{}/{}/{}'.format(
+            int(self.last_command_failed),
+            int(self.fiscal),
+            int(self.in_transaction),
+            int(not self.last_transaction_correct),
+            0,
+            datetime.date.today(),
+            '/'.join(TAX_RATES),
+            self.receipt_count,
+            '/'.join(['0.00'] * 7),
+            '0.00',
+            self.serialno
+        ).encode('ascii')
+        return 0, self._frame(body)
+
+    def transaction_begin(self, parameters, texts):
+        if self.in_transaction:
+            return WRONG_MODE, b''
+
+        self.in_transaction = True
+        self.lines = 0
+        return 0, b''
+
+    def item(self, parameters, texts):
+        if not self.in_transaction:
+            return NOT_IN_TRANSACTION, b''
+
+        item = ITEM_RE.search(texts)
+        if item is None:
+            return INVALID_VALUE, b''
+
+        value = item_value(
+            item.group('price').decode('ascii'),
+            item.group('quantity').decode('ascii')
+        )
+        if nmb(value).encode('ascii') != item.group('value'):
+            return INVALID_VALUE, b''
+
+        self.lines += 1
+        return 0, b''
+
+    def discount(self, parameters, texts):
+        if not self.in_transaction:
+            return NOT_IN_TRANSACTION, b''
+        return 0, b''
+
+    payment = discount
+
+    def transaction_end(self, parameters, texts):
+        if parameters == b'0':
+            # cancel works without an open transaction too
+            self.in_transaction = False
+            return 0, b''
+
+        if not self.in_transaction:
+            return NOT_IN_TRANSACTION, b''
+
+        self.in_transaction = False
+        self.last_transaction_correct = True
+        self.receipt_count += 1
+        return 0, b''
+
+    def open_drawer(self, parameters, texts):
+        return 0, b''
+
+    def non_fiscal_printout(self, parameters, texts):
+        return 0, b''
+
+
+class TCPTransport:
+    '''Serve the emulator on a local TCP port (socket:// url)'''
+
+    def __init__(self, emulator, host='127.0.0.1', port=0):
+        self.emulator = emulator
+        # socket.create_server needs Python 3.8
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((host, port))
+        self._server.listen()
+        self.host, self.port = self._server.getsockname()[:2]
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'socket://{}:{}'.format(self.host, self.port)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                client, _ = self._server.accept()
+            except OSError:
+                break
+
+            threading.Thread(target=self._handle, args=(client,), daemon=True).start()
+
+    def _handle(self, client):
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with client:
+            while True:
+                try:
+                    data = client.recv(4096)
+                except OSError:
+                    break
+                if not data:
+                    break
+                reply = self.emulator.handle(data)
+                if reply:
+                    client.sendall(reply)
+
+    def close(self):
+        self._server.close()
+
+
+class PTYTransport:
+    '''Serve the emulator on a pseudo terminal (POSIX only)'''
+
+    def __init__(self, emulator):
+        import tty
+
+        self.emulator = emulator
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.url = os.ttyname(self._slave)
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                data = os.read(self._master, 4096)
+            except OSError:
+                break
+            if not data:
+                break
+            reply = self.emulator.handle(data)
+            if reply:
+                os.write(self._master, reply)
+
+    def close(self):
+        for fd in (self._slave, self._master):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
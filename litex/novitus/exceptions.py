@@ -1,6 +1,3 @@
-from pprint import pprint
-
-
 error_codes = {
     1: 'Nie zainicjowany zegar RTC',
     2: 'Nieprawidłowy bajt kontrolny',
@@ -137,6 +134,10 @@ class CommunicationError(NovitusError):
     pass
 
 
+class CommunicationTimeout(CommunicationError):
+    pass
+
+
 class ReplyNotImplemented(NovitusError):
     pass
 
@@ -156,3 +157,25 @@ class ProtocolError(NovitusError):
         return self.args[0]
 
     __str__ = __repr__
+
+
+class BatchError(ProtocolError):
+    def __init__(self, error_code, index, command, packet):
+        super(BatchError, self).__init__(error_code)
+        self.index = index
+        self.command = command
+        self.packet = packet
+
+
+class ValidationError(ProtocolError, ValueError):
+    '''Arguments the printer would reject with error_code, found locally'''
+
+    def __init__(self, error_code, field, reason):
+        super(ValidationError, self).__init__(error_code)
+        self.field = field
+        self.reason = reason
+        self.args = (
+            'Validation failed: {} - {} ({}: {})'.format(error_code, self.msg, field, reason),
+            error_code,
+            self.msg
+        )
@@ -1,8 +1,10 @@
-import re
+import codecs
+import functools
+from decimal import Decimal, ROUND_HALF_UP
 
 
 from . import mazovia
-from .exceptions import ReplyNotImplemented
+from .replies import parse_reply, PTU_LETTERS
 
 
 def yn(val: bool) -> str:
@@ -10,63 +12,261 @@ def yn(val: bool) -> str:
     return 'yes' if val else 'no'
 
 
-def nmb(val: float) -> str:
+CENT = Decimal('0.01')
+
+
+def money(val) -> Decimal:
+    '''
+    Amount as Decimal rounded half up to grosze, as the printer does
+
+    floats are taken by their shortest repr, so 1.005 is 1.01 and not
+    the 1.00 of its binary value.
+    '''
+    if not isinstance(val, Decimal):
+        val = Decimal(repr(val) if isinstance(val, float) else val)
+
+    return val.quantize(CENT, ROUND_HALF_UP)
+
+
+@functools.lru_cache(maxsize=4096, typed=True)
+def _nmb(val):
+    return str(money(val))
+
+
+def nmb(val) -> str:
     '''Protocol compatible number format'''
-    return '{:.2f}'.format(val)
+    if type(val) is int:
+        return '%d.00' % val
+
+    try:
+        return _nmb(val)
+    except TypeError:
+        # unhashable
+        return str(money(val))
+
+
+@functools.lru_cache(maxsize=4096, typed=True)
+def item_value(price, quantity) -> Decimal:
+    '''Item value as the printer computes it from the sent price and quantity'''
+    return money(money(price) * money(quantity))
+
+
+@functools.lru_cache(maxsize=None)
+def encoder(encoding='mazovia'):
+    '''Fast str -> bytes function for the encoding, bypassing codec lookups'''
+    info = codecs.lookup(encoding)
+
+    if info.name == 'mazovia':
+        return mazovia.encode
+
+    encode = info.encode
+
+    if encode('ASCII ;/\r')[0] != b'ASCII ;/\r':
+        return lambda txt: encode(txt)[0]
+
+    def encode_ascii_compatible(txt):
+        if txt.isascii():
+            return txt.encode('ascii')
+        return encode(txt)[0]
+
+    return encode_ascii_compatible
+
+
+@functools.lru_cache(maxsize=None)
+def decoder(encoding='mazovia'):
+    '''Fast bytes -> str function for the encoding, bypassing codec lookups'''
+    info = codecs.lookup(encoding)
+
+    if info.name == 'mazovia':
+        return mazovia.decode
+
+    decode = info.decode
+
+    if decode(b'ASCII ;/\r')[0] != 'ASCII ;/\r':
+        return lambda data: decode(data)[0]
+
+    def decode_ascii_compatible(data):
+        if data.isascii():
+            return data.decode('ascii')
+        return decode(data)[0]
+
+    return decode_ascii_compatible
+
+
+# Checksum hex digits (the same in all supported encodings)
+CHECKSUM_DIGITS = tuple('{:02X}'.format(chk).encode('ascii') for chk in range(256))
+
+
+# Below this size a plain loop beats folding a big integer
+XOR_FOLD_THRESHOLD = 64
+
+
+def xor(data: bytes, chk: int = 0) -> int:
+    '''XOR of all the bytes (bytes, bytearray or memoryview), starting from chk'''
+    size = len(data)
+
+    if size < XOR_FOLD_THRESHOLD:
+        for el in data:
+            chk ^= el
+
+        return chk
+
+    # fold the halves of the data read as one integer until a byte is left
+    bits = 8 << (size - 1).bit_length()
+    val = int.from_bytes(data, 'little')
+
+    while bits > 8:
+        bits >>= 1
+        val = (val >> bits) ^ (val & ((1 << bits) - 1))
+
+    return val ^ chk
+
+
+class Checksum:
+    '''Incremental packet checksum'''
+    __slots__ = ('value',)
+
+    def __init__(self, data=b'', value=255):
+        self.value = xor(data, value)
+
+    def update(self, data):
+        self.value = xor(data, self.value)
+        return self
+
+    def copy(self):
+        return Checksum(value=self.value)
+
+    def digest(self) -> bytes:
+        return CHECKSUM_DIGITS[self.value]
 
 
 def checksum(txt: str, encoding='mazovia') -> str:
     '''Packet checksum'''
-    chk = 255
-    for el in txt:
-        chk ^= el
+    return CHECKSUM_DIGITS[xor(txt, 255)]
+
+
+class PacketTemplate:
+    '''
+    Packet with its parameters and command encoded and checksummed once
+
+    Only the texts are encoded and added to the checksum when rendered.
+    '''
+    __slots__ = ('prefix', 'chk', 'encode')
+
+    def __init__(self, command, parameters='', encoding='mazovia'):
+        self.encode = encoder(encoding)
+        self.prefix = b'\x1bP' + self.encode(parameters + command)
+        self.chk = xor(self.prefix[2:], 255)
+
+    def render(self, texts=tuple()):
+        body = self.encode(''.join(texts))
+        return (
+            self.prefix + body
+            + CHECKSUM_DIGITS[xor(body, self.chk)] + b'\x1b\\'
+        )
+
+
+class FrameDecoder:
+    '''
+    Incremental decoder of ESC P ... ESC \\ frames
+
+    Received bytes are fed as they arrive and complete frames are returned
+    at once. Bytes outside frames are dropped and a frame start found
+    inside an unterminated frame restarts decoding from it.
+    '''
+    __slots__ = ('_buffer',)
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        buf = self._buffer
+        buf += data
+        frames = []
+
+        while True:
+            start = buf.find(b'\x1bP')
+
+            if start == -1:
+                # a trailing ESC may begin the next frame
+                del buf[:len(buf) - buf.endswith(b'\x1b')]
+                break
+
+            end = buf.find(b'\x1b\\', start + 2)
+
+            if end == -1:
+                del buf[:start]
+                break
+
+            restart = buf.rfind(b'\x1bP', start + 2, end)
+            if restart != -1:
+                start = restart
 
-    return ('{:02x}'.format(chk)).upper().encode(encoding)
+            frames.append(bytes(buf[start:end + 2]))
+            del buf[:end + 2]
+
+        return frames
+
+    def reset(self):
+        self._buffer.clear()
+
+
+def verify_frame(frame: bytes) -> bool:
+    '''Check the checksum of a complete frame'''
+    return len(frame) >= 6 and checksum(frame[2:-4]) == frame[-4:-2]
+
+
+@functools.lru_cache(maxsize=1024)
+def packet_template(command, parameters='', encoding='mazovia'):
+    return PacketTemplate(command, parameters, encoding)
 
 
 def unpack_flags(flags: bytes) -> list:
     return [flags[i//8] & 1 << i%8 != 0 for i in range(len(flags) * 8)]
 
 
+def parse_dle_status(status: bytes) -> dict:
+    '''DLE status byte'''
+    flags = unpack_flags(status)[:3]
+    return {
+        'online': yn(flags[2]),
+        'papererror': yn(flags[1]),
+        'printererror': yn(flags[0])
+    }
+
+
+def parse_enq_status(status: bytes) -> dict:
+    '''ENQ status byte'''
+    flags = unpack_flags(status)[:4]
+    return {
+        'fiscal': yn(flags[3]),
+        'lastcommanderror': yn(flags[2]),
+        'intransaction': yn(flags[1]),
+        'lasttransactioncorrect': yn(flags[0])
+    }
+
+
+def parse_error_reply(pkt: bytes) -> int:
+    '''#n reply'''
+    return int(pkt[5:-2])
+
+
 def assemble_packet(
         command,
         parameters=tuple(),
         texts=tuple(),
         encoding='mazovia'
     ):
-        txt = ''.join(parameters)
-        txt += command
-        txt += ''.join(texts)
-
-        pkt = txt.encode(encoding)
-
-        return b'\x1bP' + pkt + checksum(pkt, encoding) + b'\x1b\\'
+        return packet_template(command, ''.join(parameters), encoding).render(texts)
 
 
-def parse_cash_register_data_reply(pkt):
-    type_ = pkt[:3]
-
-    reply = None
-
-    if type_ == b'2#X':
-        reply = re.match(
-            b'^(?P<lastcommanderror>[01]);(?P<fiscal>[01]);(?P<intransaction>[01]);'
-            b'(?P<lasttransactionerror>[01]);1;(?P<zeroingcount>\d+);(?P<year>\d{1,2});'
-            b'(?P<month>\d{1,2});(?P<day>\d{1,2})/(?P<PTU_A>[\d.]+)/(?P<PTU_B>[\d.]+)/'
-            b'(?P<PTU_C>[\d.]+)/(?P<PTU_D>[\d.]+)/(?P<PTU_E>[\d.]+)/(?P<PTU_F>[\d.]+)/'
-            b'(?P<PTU_G>[\d.]+)/(?P<receiptcount>\d+)/(?P<TOT_A>[\d.]+)/(?P<TOT_B>[\d.]+)/'
-            b'(?P<TOT_C>[\d.]+)/(?P<TOT_D>[\d.]+)/(?P<TOT_E>[\d.]+)/(?P<TOT_F>[\d.]+)/(?P<TOT_G>[\d.]+)/'
-            b'(?P<cash>[\d.]+)/(?P<serialno>.*)',
-            pkt[3:-2]
-        ).groupdict()
-    else:
-        raise ReplyNotImplemented
-
-    return reply
+def parse_cash_register_data_reply(pkt, strict=True):
+    '''#s reply (with the checksum), parsed by its type'''
+    return parse_reply(pkt[:-2], strict)
 
 
 def parse_ptu_percentages(val, encoding='mazovia'):
-    ret = val.lstrip(b'0').decode(encoding) + '%'
+    ret = decoder(encoding)(val.lstrip(b'0')) + '%'
 
     if ret == '100.00%':
         ret = 'free'
@@ -75,3 +275,9 @@ def parse_ptu_percentages(val, encoding='mazovia'):
 
     return ret
 
+
+def parse_taxrates(reply, encoding='mazovia'):
+    return [
+        (letter, parse_ptu_percentages(reply['PTU_' + letter], encoding))
+        for letter in PTU_LETTERS
+    ]
@@ -0,0 +1,195 @@
+'''
+Text layout for non-fiscal printouts
+
+Wraps, aligns and tabulates text into lines of the width of a printer
+font, with the characters the printer encoding lacks replaced by their
+closest equivalent (decomposed Polish letters are composed first, other
+accented letters lose their accents, the rest becomes '?'). Rendered
+texts and rows are cached, so recurring headers, footers and report rows
+cost a dict lookup:
+
+    layout = Layout()
+    lines = layout.text('Raport zmiany', align='center')
+    lines += layout.table(rows, aligns='<>>')
+    printer.non_fiscal_printout(lines, printout_no=200, line_no=1)
+'''
+import functools
+import textwrap
+import unicodedata
+
+
+from .helpers import encoder
+
+
+# Characters per line of the font numbers of non_fiscal_printout_line,
+# for 57 mm paper; pass the widths of the printer model to Layout
+FONT_WIDTHS = {
+    0: 40,
+    1: 20
+}
+
+
+ALIGNMENTS = {
+    '<': str.ljust,
+    '>': str.rjust,
+    '^': str.center,
+    'left': str.ljust,
+    'right': str.rjust,
+    'center': str.center
+}
+
+
+@functools.lru_cache(maxsize=4096)
+def printable(text, encoding='mazovia'):
+    '''The text with the characters missing in the encoding replaced'''
+    text = unicodedata.normalize('NFC', text)
+    encode = encoder(encoding)
+
+    try:
+        encode(text)
+        return text
+    except UnicodeEncodeError:
+        pass
+
+    chars = []
+    for char in text:
+        try:
+            encode(char)
+        except UnicodeEncodeError:
+            char = ''.join(
+                c for c in unicodedata.normalize('NFKD', char) if not unicodedata.combining(c)
+            )
+            try:
+                encode(char)
+            except UnicodeEncodeError:
+                char = '?'
+        chars.append(char)
+
+    return ''.join(chars)
+
+
+@functools.lru_cache(maxsize=4096)
+def wrap(text, width):
+    '''Word wrapped lines (tuple) of text, keeping its line breaks'''
+    lines = []
+
+    for paragraph in text.split('\n'):
+        lines += textwrap.wrap(
+            paragraph,
+            width,
+            break_on_hyphens=False,
+            drop_whitespace=True
+        ) or ['']
+
+    return tuple(lines)
+
+
+def align(text, width, how='<'):
+    return ALIGNMENTS[how](text, width)
+
+
+def fit_widths(natural, width, separator=1):
+    '''
+    Shrink natural column widths to fit the line
+
+    The widest column gives up characters first, down to the width of
+    the next widest one, then both shrink together, and so on.
+    '''
+    widths = list(natural)
+    excess = sum(widths) + separator * (len(widths) - 1) - width
+
+    while excess > 0:
+        widest = max(widths)
+        if widest <= 1:
+            raise ValueError('{} columns do not fit in {} characters'.format(len(widths), width))
+
+        columns = [index for index, w in enumerate(widths) if w == widest]
+        floor = max([w for w in widths if w < widest], default=1)
+        step = min(widest - floor, -(-excess // len(columns)))
+
+        for index in columns:
+            if excess <= 0:
+                break
+            cut = min(step, excess)
+            widths[index] -= cut
+            excess -= cut
+
+    return widths
+
+
+@functools.lru_cache(maxsize=4096)
+def _row(values, widths, aligns, separator):
+    cells = [wrap(value, width) for value, width in zip(values, widths)]
+    height = max(len(cell) for cell in cells)
+
+    return tuple(
+        separator.join(
+            align(cell[line] if line < len(cell) else '', width, how)
+            for cell, width, how in zip(cells, widths, aligns)
+        ).rstrip()
+        for line in range(height)
+    )
+
+
+class Layout:
+    '''Line layout for a font of a printer'''
+
+    def __init__(self, encoding='mazovia', font=0, widths=FONT_WIDTHS):
+        self.encoding = encoding
+        self.font = font
+        self.width = widths[font]
+
+    def text(self, text, align='<'):
+        '''Wrapped and aligned lines of a text'''
+        return [
+            ALIGNMENTS[align](line, self.width).rstrip()
+            for line in wrap(printable(text, self.encoding), self.width)
+        ]
+
+    def rule(self, char='-'):
+        return char * self.width
+
+    def row(self, values, widths, aligns=None, separator=' '):
+        '''Lines of a table row, cells wrapped within their column widths'''
+        return list(_row(
+            tuple(printable(str(value), self.encoding) for value in values),
+            tuple(widths),
+            tuple(aligns or '<' * len(widths)),
+            separator
+        ))
+
+    def table(self, rows, aligns=None, header=None, widths=None, separator=' '):
+        '''
+        Lines of a table
+
+        Column widths are fitted to the line from the widest values unless
+        given; aligns is a sequence (or string) of '<', '>', '^' per column.
+        A header row is followed by a rule.
+        '''
+        rows = [
+            tuple(printable(str(value), self.encoding) for value in row)
+            for row in rows
+        ]
+
+        if widths is None:
+            natural = [
+                max(len(value) for value in column)
+                for column in zip(*(rows + [tuple(header)] if header else rows))
+            ]
+            widths = fit_widths(natural, self.width, len(separator))
+
+        widths = tuple(widths)
+        aligns = tuple(aligns or '<' * len(widths))
+        lines = []
+
+        if header:
+            lines += _row(
+                tuple(printable(str(value), self.encoding) for value in header),
+                widths, aligns, separator
+            )
+            lines.append(self.rule())
+
+        for row in rows:
+            lines += _row(row, widths, aligns, separator)
+
+        return lines
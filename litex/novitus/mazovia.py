@@ -3,20 +3,21 @@
 """#"
 
 import codecs
+import functools
 
 ### Codec APIs
 
 class Codec(codecs.Codec):
 
     def encode(self, input, errors='strict'):
-        return codecs.charmap_encode(input, errors, encoding_table)
+        return codecs.charmap_encode(input, errors, get_encoding_table())
 
     def decode(self, input, errors='strict'):
         return codecs.charmap_decode(input, errors, decoding_table)
 
 class IncrementalEncoder(codecs.IncrementalEncoder):
     def encode(self, input, final=False):
-        return codecs.charmap_encode(input, self.errors, encoding_table)[0]
+        return codecs.charmap_encode(input, self.errors, get_encoding_table())[0]
 
 class IncrementalDecoder(codecs.IncrementalDecoder):
     def decode(self, input, final=False):
@@ -28,6 +29,18 @@ class StreamWriter(Codec, codecs.StreamWriter):
 class StreamReader(Codec, codecs.StreamReader):
     pass
 
+### Fast path (no codec registry lookup)
+
+def encode(input, errors='strict'):
+    if input.isascii():
+        return input.encode('ascii')
+    return codecs.charmap_encode(input, errors, get_encoding_table())[0]
+
+def decode(input, errors='strict'):
+    if input.isascii():
+        return input.decode('ascii')
+    return codecs.charmap_decode(input, errors, decoding_table)[0]
+
 ### encodings module API
 
 def getregentry():
@@ -41,8 +54,13 @@ def getregentry():
         streamwriter=StreamWriter,
     )
 
-def searchfunc(_):
-    return getregentry()
+NAMES = frozenset(['mazovia'])
+
+def searchfunc(name):
+    # answer only for our own name, leave other lookups to other codecs
+    if name.replace('-', '_') in NAMES:
+        return getregentry()
+    return None
 
 codecs.register(searchfunc)
 
@@ -307,6 +325,14 @@ decoding_table = (
     '\xa0'      #  0xFF -> NO-BREAK SPACE
 )
 
-### Encoding table
-encoding_table = codecs.charmap_build(decoding_table)
+### Encoding table (built on first use)
+
+@functools.lru_cache(maxsize=None)
+def get_encoding_table():
+    return codecs.charmap_build(decoding_table)
+
+def __getattr__(name):
+    if name == 'encoding_table':
+        return get_encoding_table()
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
 
@@ -0,0 +1,207 @@
+'''
+Printer metrics
+
+Counts commands, their round trip latency, protocol errors, timeouts,
+reconnects and DLE paper errors of attached printers (collected by
+instrumentation hooks, see tracing) and renders them in the Prometheus
+text format, optionally served over HTTP:
+
+    metrics = Metrics()
+    metrics.attach_pool(pool)
+    metrics.serve(9464)
+'''
+import collections
+import functools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+from .exceptions import CommunicationTimeout, error_codes
+from .helpers import parse_dle_status
+
+
+# Latency histogram bucket bounds (in seconds)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(
+        '{}="{}"'.format(name, _escape(value)) for name, value in labels.items()
+    ) + '}'
+
+
+class Histogram:
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, **labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield name + '_bucket' + _labels(**labels, le=repr(bound)), cumulative
+
+        yield name + '_bucket' + _labels(**labels, le='+Inf'), self.count
+        yield name + '_sum' + _labels(**labels), self.sum
+        yield name + '_count' + _labels(**labels), self.count
+
+
+class Metrics:
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.commands = collections.Counter()
+        self.latency = {}
+        self.protocol_errors = collections.Counter()
+        self.timeouts = collections.Counter()
+        self.paper_errors = collections.Counter()
+        self.printers = {}
+        self._last_error = {}
+        self._lock = threading.Lock()
+
+    def attach(self, printer, name=None):
+        '''Collect metrics of the printer, labelled with name (url by default)'''
+        name = name or printer.url
+        hook = functools.partial(self.observe, name)
+
+        printer.hooks.append(hook)
+        self.printers[name] = printer
+
+        return hook
+
+    def attach_pool(self, pool):
+        for url, worker in pool.workers.items():
+            self.attach(worker.printer, url)
+
+    def observe(self, name, trace):
+        '''Instrumentation hook body, see tracing.CommandTrace'''
+        with self._lock:
+            key = (name, trace.command)
+
+            self.commands[key] += 1
+
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = Histogram(self.buckets)
+            histogram.observe(trace.duration)
+
+            # a failing ENQ or #n is reported again by the enclosing command
+            if trace.error is not None and self._last_error.get(name) is not trace.error:
+                self._last_error[name] = trace.error
+
+                if trace.error_code is not None:
+                    self.protocol_errors[(name, trace.error_code)] += 1
+                elif isinstance(trace.error, CommunicationTimeout):
+                    self.timeouts[name] += 1
+
+            if (
+                trace.command == 'DLE'
+                and trace.reply
+                and parse_dle_status(trace.reply)['papererror'] == 'yes'
+            ):
+                self.paper_errors[name] += 1
+
+    def samples(self):
+        '''(metric name, type, help, [(sample, value)]) of all the metrics'''
+        with self._lock:
+            yield 'novitus_commands_total', 'counter', 'Commands sent', [
+                ('novitus_commands_total' + _labels(printer=name, command=command), count)
+                for (name, command), count in sorted(self.commands.items())
+            ]
+
+            yield 'novitus_command_duration_seconds', 'histogram', 'Command round trip time', [
+                sample
+                for (name, command), histogram in sorted(self.latency.items())
+                for sample in histogram.samples(
+                    'novitus_command_duration_seconds', printer=name, command=command
+                )
+            ]
+
+            yield 'novitus_protocol_errors_total', 'counter', 'Errors reported by printers', [
+                (
+                    'novitus_protocol_errors_total' + _labels(
+                        printer=name,
+                        code=code,
+                        message=error_codes.get(code, 'unknown error code')
+                    ),
+                    count
+                )
+                for (name, code), count in sorted(self.protocol_errors.items())
+            ]
+
+            yield 'novitus_timeouts_total', 'counter', 'Replies not received in time', [
+                ('novitus_timeouts_total' + _labels(printer=name), count)
+                for name, count in sorted(self.timeouts.items())
+            ]
+
+            yield 'novitus_paper_errors_total', 'counter', 'DLE statuses with paper error', [
+                ('novitus_paper_errors_total' + _labels(printer=name), count)
+                for name, count in sorted(self.paper_errors.items())
+            ]
+
+            yield 'novitus_reconnects_total', 'counter', 'Reconnections after lost links', [
+                ('novitus_reconnects_total' + _labels(printer=name), printer.reconnects)
+                for name, printer in sorted(self.printers.items())
+            ]
+
+    def render(self):
+        '''Prometheus text exposition format'''
+        lines = []
+
+        for name, type_, help_, samples in self.samples():
+            lines.append('# HELP {} {}'.format(name, help_))
+            lines.append('# TYPE {} {}'.format(name, type_))
+            lines += ['{} {}'.format(sample, value) for sample, value in samples]
+
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port=9464, host='127.0.0.1'):
+        '''
+        Serve the metrics on http://host:port/metrics from a daemon thread,
+        returns the server (call shutdown() to stop it)
+        '''
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        return server
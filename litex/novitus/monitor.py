@@ -0,0 +1,143 @@
+'''
+Printer status monitor
+
+A background thread sampling DLE and ENQ while the printer is idle, so
+the status is read from a snapshot instead of a round trip:
+
+    monitor = StatusMonitor(printer)
+    monitor.subscribe(lambda event, status: print(event))
+    monitor.start()
+
+    if monitor.status.papererror == 'yes':
+        ...
+'''
+import logging
+import threading
+import time
+from collections import namedtuple
+
+
+from .exceptions import CommunicationError
+
+
+log = logging.getLogger(__name__)
+
+
+Status = namedtuple('Status', [
+    'time',                     # time.monotonic() of the sample
+    'reachable',                # printer answered
+    'online',                   # DLE flags ('yes'/'no')
+    'papererror',
+    'printererror',
+    'fiscal',                   # ENQ flags ('yes'/'no')
+    'lastcommanderror',
+    'intransaction',
+    'lasttransactioncorrect',
+    'transaction_since'         # time.monotonic() the transaction was seen open first
+])
+
+
+UNKNOWN = Status(0.0, False, *['no'] * 7, None)
+
+
+# (field, value) -> event name, sent when the field changes to the value
+EVENTS = {
+    ('reachable', False): 'unreachable',
+    ('reachable', True): 'reachable',
+    ('online', 'no'): 'offline',
+    ('online', 'yes'): 'online',
+    ('papererror', 'yes'): 'paper_out',
+    ('papererror', 'no'): 'paper_ok',
+    ('printererror', 'yes'): 'printer_error',
+    ('printererror', 'no'): 'printer_ok'
+}
+
+
+class StatusMonitor(threading.Thread):
+    '''
+    Sample the printer status every interval seconds
+
+    A sample is skipped when the printer is busy (its lock is held) or was
+    used less than interval seconds ago, so fiscal traffic is never delayed.
+    Subscribers are called with (event, status) from the monitor thread;
+    a transaction open for longer than stuck_after seconds is reported
+    as 'stuck_in_transaction'.
+    '''
+
+    def __init__(self, printer, interval=1.0, stuck_after=300):
+        super().__init__(name='novitus-monitor-{}'.format(printer.url), daemon=True)
+        self.printer = printer
+        self.interval = interval
+        self.stuck_after = stuck_after
+        self.status = UNKNOWN
+        self._stuck = False
+        self._subscribers = []
+        self._stopped = threading.Event()
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def stop(self, wait=True):
+        self._stopped.set()
+
+        if wait and self.is_alive():
+            self.join()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            if time.monotonic() - self.printer._last_io >= self.interval:
+                self.sample()
+
+    def sample(self):
+        '''Take a sample unless the printer is busy, returns the status'''
+        printer = self.printer
+
+        if not printer.lock.acquire(blocking=False):
+            return self.status
+
+        try:
+            dle = printer.dle()
+            enq = printer.enq()
+        except CommunicationError as exc:
+            log.debug('Status sample failed: %s', exc)
+            status = self.status._replace(time=time.monotonic(), reachable=False)
+        else:
+            now = time.monotonic()
+            since = None
+            if enq['intransaction'] == 'yes':
+                since = self.status.transaction_since or now
+
+            status = Status(now, True, **dle, **enq, transaction_since=since)
+        finally:
+            printer.lock.release()
+
+        self._publish(status)
+
+        return status
+
+    def _publish(self, status):
+        previous, self.status = self.status, status
+        events = [
+            EVENTS[(field, getattr(status, field))]
+            for field in ('reachable', 'online', 'papererror', 'printererror')
+            if getattr(status, field) != getattr(previous, field)
+            and (field, getattr(status, field)) in EVENTS
+        ]
+
+        stuck = (
+            status.transaction_since is not None
+            and status.time - status.transaction_since > self.stuck_after
+        )
+        if stuck != self._stuck and status.reachable:
+            self._stuck = stuck
+            events.append('stuck_in_transaction' if stuck else 'transaction_closed')
+
+        for event in events:
+            for callback in list(self._subscribers):
+                try:
+                    callback(event, status)
+                except Exception:
+                    log.exception('Status subscriber %r failed', callback)
@@ -0,0 +1,155 @@
+'''
+Multi printer pool
+
+Every device gets its own worker thread and job queue, so protocol
+traffic of a single device is never interleaved while all the devices
+work in parallel.
+'''
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+from serial.tools import list_ports
+
+
+from .printer import Printer
+
+
+log = logging.getLogger(__name__)
+
+
+def resolve_urls(urls):
+    '''Expand hwgrep:// patterns into urls of all the matching ports'''
+    resolved = []
+
+    for url in urls:
+        if url.startswith('hwgrep://'):
+            pattern = url[len('hwgrep://'):].split('&')[0]
+            resolved += sorted(port.device for port in list_ports.grep(pattern))
+        else:
+            resolved.append(url)
+
+    return list(dict.fromkeys(resolved))
+
+
+class Worker(threading.Thread):
+
+    def __init__(self, printer):
+        super().__init__(name='novitus-{}'.format(printer.url), daemon=True)
+        self.printer = printer
+        self.jobs = queue.Queue()
+        self.busy = False
+        self.completed = 0
+        self.failed = 0
+        self.busy_time = 0.0
+        self.started = time.monotonic()
+
+    @property
+    def load(self):
+        return self.jobs.qsize() + self.busy
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+
+            if job is None:
+                break
+
+            future, fn, args, kwargs = job
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            self.busy = True
+            start = time.monotonic()
+            try:
+                result = fn(self.printer, *args, **kwargs)
+            except BaseException as exc:
+                log.debug('Job failed on %s: %r', self.printer.url, exc)
+                self._finish(start, failed=True)
+                future.set_exception(exc)
+            else:
+                self._finish(start)
+                future.set_result(result)
+
+        self.printer.close()
+
+    def _finish(self, start, failed=False):
+        self.busy_time += time.monotonic() - start
+        self.busy = False
+
+        if failed:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started
+        done = self.completed + self.failed
+        return {
+            'queued': self.jobs.qsize(),
+            'busy': self.busy,
+            'completed': self.completed,
+            'failed': self.failed,
+            'throughput': done / elapsed if elapsed else 0.0,
+            'utilization': self.busy_time / elapsed if elapsed else 0.0
+        }
+
+
+class PrinterPool:
+    '''
+    Pool of printers, each served by a dedicated worker
+
+    Jobs are callables receiving the Printer as the first argument.
+    '''
+
+    def __init__(self, urls, printer_factory=Printer, **printer_kwargs):
+        self.workers = {
+            url: Worker(printer_factory(url, **printer_kwargs))
+            for url in resolve_urls(urls)
+        }
+
+        if not self.workers:
+            raise ValueError('No printers found')
+
+        for worker in self.workers.values():
+            worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    @property
+    def urls(self):
+        return list(self.workers)
+
+    def submit(self, fn, *args, device=None, **kwargs):
+        '''
+        Queue a job for the given device or, when device is None, for the
+        least loaded one (suitable for non-fiscal printouts).
+        '''
+        if device is None:
+            worker = min(self.workers.values(), key=lambda w: w.load)
+        else:
+            worker = self.workers[device]
+
+        future = Future()
+        worker.jobs.put((future, fn, args, kwargs))
+
+        return future
+
+    def stats(self):
+        return {url: worker.stats() for url, worker in self.workers.items()}
+
+    def shutdown(self, wait=True):
+        for worker in self.workers.values():
+            worker.jobs.put(None)
+
+        if wait:
+            for worker in self.workers.values():
+                worker.join()
@@ -1,19 +1,33 @@
 '''
 Novitus Protocol implementation
 '''
+import collections
+import contextlib
+import functools
 import logging
+import socket
+import threading
 import time
 
 
 import serial
+from serial.urlhandler import protocol_hwgrep
 
 
-from .helpers import assemble_packet, unpack_flags, yn, parse_cash_register_data_reply, parse_ptu_percentages, nmb
-from .exceptions import CommunicationError, ProtocolError
+from . import commands, validation
+from .commands import BUYER_IDENTIFIER, PAYMENT_TYPES
+from .helpers import (
+    yn, assemble_packet, unpack_flags, FrameDecoder, verify_frame,
+    parse_dle_status, parse_enq_status,
+    parse_error_reply, parse_cash_register_data_reply, parse_taxrates
+)
+from .exceptions import CommunicationError, CommunicationTimeout, ProtocolError, BatchError
+from .receipt import Totals
+from .replies import CashRegisterData
+from .tracing import CommandTrace
 
 
 log = logging.getLogger(__name__)
-log.setLevel(logging.DEBUG)
 
 
 ERROR_HANDLING = {
@@ -24,47 +38,295 @@ ERROR_HANDLING = {
 }
 
 
-BUYER_IDENTIFIER = {
-    'NIP': '1',
-    'REGON': '2',
-    'PESEL': '3'
-}
+# Delays (in seconds) between consecutive checks for the status byte
+# after DLE/ENQ has been sent
+STATUS_BACKOFF = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1)
+
+
+# Commands whose replies carry a checksum
+CHECKSUMMED_REPLIES = frozenset(['#s'])
+
+
+# Commands which do not change the cached device metadata, any other
+# (daily report, tax rates programming, ...) invalidates it
+METADATA_SAFE_COMMANDS = frozenset([
+    '#n', '#s', '#e', '$h', '$l', '$n', '$b', '$e', '$d', '$w'
+])
 
-PAYMENT_TYPES = {
-    'cash': '0',
-    'card': '1',
-    'cheque': '2',
-    'bon': '3',
-    'other': '4',
-    'credit': '5',
-    'account': '6',
-    'foreign': '7',
-    'transfer': '8',
-    'mobile': '9',
-    'voucher': '10'
+
+# Commands preceded by an implicit checkpoint in batch mode
+# ($e closes or cancels a transaction)
+BATCH_CHECKPOINTS = frozenset(['$e'])
+
+
+# Names of the status requests in latencies and traces
+STATUS_REQUESTS = {
+    b'\x10': 'DLE',
+    b'\x05': 'ENQ'
 }
 
 
+# Delays (in seconds) between consecutive reconnection attempts
+RECONNECT_BACKOFF = (0, 0.1, 0.25, 0.5, 1, 2)
+
+
+def resolve_port(url):
+    '''Translate hwgrep:// url into the matching port, leave others intact'''
+    if url.startswith('hwgrep://'):
+        return protocol_hwgrep.Serial(None).from_url(url)
+
+    return url
+
+
+def _command(build, validate=None, check=None, track=None):
+    '''
+    Printer method sending the packet built by a commands function
+
+    validate (a validation function of the same name) checks the arguments
+    first, unless the printer was created with validate=False. check and
+    track take the printer and the arguments, to check the transaction
+    totals before the packet is sent and to keep them once it was accepted.
+    '''
+    @functools.wraps(build)
+    def method(self, *args, **kwargs):
+        if validate is not None and self.validate:
+            validate(*args, encoding=self.encoding, taxrates=self._cached_taxrates(), **kwargs)
+
+        if check is not None and self.validate:
+            check(self, *args, **kwargs)
+
+        self.execute(build(*args, **kwargs))
+
+        if track is not None:
+            track(self, *args, **kwargs)
+
+    return method
+
+
+def _begin_totals(printer, *args, **kwargs):
+    printer.totals = Totals()
+
+
+def _end_totals(printer, *args, **kwargs):
+    printer.totals = None
+
+
+def _add_item(
+    printer,
+    line_no,
+    name,
+    quantity,
+    ptu,
+    price,
+    plu='',
+    description='',
+    discount_name='',
+    discount_value=None,
+    discount_descid=16
+):
+    if printer.totals is not None and printer.validate:
+        printer.totals.add(price, quantity, discount_value)
+
+
+def _check_total(printer, total, *args, **kwargs):
+    # transactions begun before this printer object are not checked
+    if printer.totals is not None:
+        printer.totals.check(total)
+
+
+class DeviceLock:
+    '''Reentrant lock which knows whether the current thread holds it'''
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._owner = None
+        self._depth = 0
+
+    def acquire(self, blocking=True, timeout=-1):
+        if not self._lock.acquire(blocking, timeout):
+            return False
+
+        self._owner = threading.get_ident()
+        self._depth += 1
+
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if not self._depth:
+            self._owner = None
+
+        self._lock.release()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def owned(self):
+        return self._owner == threading.get_ident()
+
+
+class _Flight:
+    '''Request in progress, whose result is shared with identical requests'''
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
 class Printer:
 
-    def __init__(self, url, timeout=10, encoding='mazovia'):
+    def __init__(
+        self,
+        url,
+        timeout=10,
+        encoding='mazovia',
+        status_backoff=STATUS_BACKOFF,
+        probe_timeout=0.5,
+        health_check_interval=5,
+        reconnect_backoff=RECONNECT_BACKOFF,
+        metadata_ttl=300,
+        validate=True,
+        hooks=()
+    ):
         self.url = url
         self.timeout = timeout
         self.encoding = encoding
+        self.status_backoff = status_backoff
+        self.probe_timeout = probe_timeout
+        self.health_check_interval = health_check_interval
+        self.reconnect_backoff = reconnect_backoff
+        self.metadata_ttl = metadata_ttl
+        self.validate = validate
+        self.totals = None
+        self.hooks = list(hooks)
+        # held for every exchange with the device (and for whole batches),
+        # so status requests from other threads never interleave with them
+        self.lock = DeviceLock()
+        self.latencies = {}
+        self.reconnects = 0
         self._conn = None
+        self._dropped = False
+        self._port = None
+        self._last_io = 0.0
+        self._decoder = FrameDecoder()
+        self._frames = collections.deque()
+        self._metadata = None
+        self._metadata_time = 0.0
+        self._batch = None
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self._progress = None
 
     @property
     def conn(self):
         if self._conn is None:
-            self._conn = serial.serial_for_url(self.url)
+            if self._port is None:
+                self._port = resolve_port(self.url)
+
+            try:
+                self._conn = serial.serial_for_url(self._port)
+            except (serial.SerialException, OSError):
+                # the device might have been re-enumerated under another name
+                self._port = None
+                raise
+
             self._conn.timeout = self.timeout
+            self._last_io = time.monotonic()
+
+            # socket:// links: do not let Nagle delay the ENQ following a packet
+            sock = getattr(self._conn, '_socket', None)
+            if sock is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
         return self._conn
 
     def close(self):
-        if self._conn is not None:
-            self._conn.close()
-            self._conn = None
+        with self.lock:
+            self._decoder.reset()
+            self._frames.clear()
+
+            if self._conn is not None:
+                conn, self._conn = self._conn, None
+                self._dropped = True
+                try:
+                    conn.close()
+                except (serial.SerialException, OSError):
+                    pass
+
+    @contextlib.contextmanager
+    def _link(self):
+        '''Drop the connection on I/O errors, so it is reopened on next use'''
+        with self.lock:
+            try:
+                yield
+            except (serial.SerialException, OSError) as exc:
+                self.close()
+                raise CommunicationError('Connection lost: {}'.format(exc)) from exc
+            except CommunicationError:
+                self.close()
+                raise
+
+            self._link_up()
+
+    def _link_up(self):
+        '''Note a successful exchange, counting the first one after a drop'''
+        self._last_io = time.monotonic()
+
+        if self._dropped:
+            self._dropped = False
+            self.reconnects += 1
+            self.invalidate_metadata()
+            log.info('Reconnected to %s', self._port)
+
+    def ping(self):
+        '''Cheap DLE probe, True if the printer answered within probe_timeout'''
+        with self.lock:
+            if self._batch:
+                self.checkpoint()
+
+            try:
+                conn = self.conn
+                conn.reset_input_buffer()
+                conn.write(b'\x10')
+
+                deadline = time.monotonic() + self.probe_timeout
+                while not conn.in_waiting:
+                    if time.monotonic() > deadline:
+                        return False
+                    time.sleep(0.002)
+
+                conn.read()
+            except (serial.SerialException, OSError):
+                return False
+
+            self._link_up()
+
+        return True
+
+    def reconnect(self):
+        '''Reopen the connection with bounded backoff until the printer answers'''
+        with self.lock:
+            for delay in self.reconnect_backoff:
+                time.sleep(delay)
+                self.close()
+
+                if self.ping():
+                    return
+
+            raise CommunicationError('Printer unreachable')
+
+    def _check_link(self):
+        if (
+            self._conn is not None
+            and self.health_check_interval is not None
+            and time.monotonic() - self._last_io > self.health_check_interval
+            and not self.ping()
+        ):
+            self.reconnect()
 
     def send_command(
         self,
@@ -76,51 +338,454 @@ class Printer:
     ):
         pkt = assemble_packet(command, parameters, texts, self.encoding)
 
-        log.debug('Sending command: %s', pkt)
-        self.conn.write(pkt)
+        return self.send_packet(command, pkt, read_reply, check_for_errors)
 
-        if read_reply:
-            reply = self.conn.read_until(b'\x1b\\', 5000)
+    def send_packet(
+        self,
+        command,
+        pkt,
+        read_reply=False,
+        check_for_errors=False
+    ):
+        with self.lock:
+            return self._send_packet(command, pkt, read_reply, check_for_errors)
+
+    def _send_packet(self, command, pkt, read_reply, check_for_errors):
+        if command not in METADATA_SAFE_COMMANDS:
+            self.invalidate_metadata()
+
+        if self._batch is not None:
+            if check_for_errors and not read_reply and command not in BATCH_CHECKPOINTS:
+                return self._send_batched(command, pkt)
+            self.checkpoint()
+
+        self._check_link()
+
+        start = written = replied = time.perf_counter()
+        error = reply = None
+        try:
+            with self._link():
+                if read_reply:
+                    self._drain()
+
+                log.debug('Sending command: %s', pkt)
+                self.conn.write(pkt)
+                written = replied = time.perf_counter()
+
+                if read_reply:
+                    reply = self._read_frame()
+                    replied = time.perf_counter()
+                    log.debug('Received reply: %s', reply)
+
+                    if command in CHECKSUMMED_REPLIES and not verify_frame(reply):
+                        raise CommunicationError('Invalid reply checksum')
+
+            if check_for_errors:
+                self.check_for_errors()
+        except Exception as exc:
+            error = exc
+            raise
+        finally:
+            end = time.perf_counter()
+            self._record_latency(command, end - start)
+
+            if self.hooks:
+                self._trace(
+                    command, len(pkt), written - start, replied - written,
+                    end - replied if check_for_errors else None, end - start, error, reply
+                )
 
-            if not reply:
-                raise CommunicationError('No reply from printer')
+        return reply
 
-            log.debug('Received reply: %s', reply)
-        else:
-            reply = None
+    def execute(self, cmd):
+        return self.send_command(
+            cmd.command,
+            cmd.parameters,
+            cmd.texts,
+            check_for_errors=cmd.check_for_errors
+        )
 
-        if check_for_errors:
-            time.sleep(0.1)
+    def print_document(self, document):
+        '''
+        Print a transaction prepared with a builder (Receipt, Invoice)
+
+        The document is rendered into a single buffer, whose packets are
+        written in batch mode. Progress is kept in document.sent and
+        document.confirmed, so an interrupted transaction can be finished
+        with resume_document.
+        '''
+        with self.lock:
+            document.sent = document.confirmed = 0
+            self._print_frames(document)
+
+    def resume_document(self, document):
+        '''
+        Finish a transaction interrupted by a communication error
+
+        Packets are counted in document.sent once written and in
+        document.confirmed once their status byte reported no error. The
+        written but unconfirmed ones are judged by the printer state: when
+        it is still in the transaction and the last command it processed
+        succeeded, they were accepted and only the remaining packets are
+        sent. When one of them failed, which one is not known, so the
+        transaction is cancelled and printed again. A transaction no longer
+        open on the printer is either complete (all packets written and
+        the last transaction correct) or was aborted and is printed again.
+        '''
+        with self.lock:
+            self._resume_document(document)
+
+    def _resume_document(self, document):
+        if not self.ping():
+            self.reconnect()
+
+        status = self.enq()
+        failed = status['lastcommanderror'] == 'yes'
+
+        if failed:
+            self.get_error()
+
+        if status['intransaction'] == 'no':
+            complete = (
+                not failed
+                and document.sent == len(document.commands())
+                and status['lasttransactioncorrect'] == 'yes'
+            )
+
+            if complete:
+                document.confirmed = document.sent
+                return
+
+            log.info('Transaction aborted by the printer, printing it again')
+            document.confirmed = 0
+        elif not failed:
+            document.confirmed = document.sent
+        elif document.confirmed < document.sent:
+            log.info('Unconfirmed packet rejected, cancelling the transaction')
+            self.receipt_cancel()
+            document.confirmed = 0
+
+        document.sent = document.confirmed
+        self._print_frames(document)
+
+    def _print_frames(self, document):
+        buf, frames = document.render(self.encoding)
+        view = memoryview(buf)
+
+        with self.batch():
+            self._progress = document
+            try:
+                for command, start, end in frames[document.sent:]:
+                    if command in BATCH_CHECKPOINTS:
+                        self.checkpoint()
+
+                    self.send_packet(command, view[start:end], check_for_errors=True)
+                    document.sent += 1
+
+                    if not self._batch:
+                        # sent unbatched and error checked
+                        document.confirmed = document.sent
+            finally:
+                self._progress = None
+
+    def non_fiscal_printout(
+        self,
+        lines,
+        printout_no,
+        header_no=0,
+        options=0,
+        line_no=0,
+        system_no='',
+        additional_lines=tuple(),
+        chunk_lines=32,
+        **line_options
+    ):
+        '''
+        Print a non-fiscal printout of lines taken from any iterable
+
+        Lines are strings or sequences of the args of a non_fiscal_printout_line
+        (line_options are its formatting options, shared by all the lines).
+        The protocol carries a single line per $w packet, so packets are
+        written chunk_lines at a time in one write, each followed by an ENQ,
+        and the statuses are collected before the next chunk: errors are
+        checked once per chunk and the printer input buffer never holds
+        more than a chunk. Only one chunk of lines is kept in memory.
+
+        A failing line raises BatchError with its index in lines; the
+        printout is left open then.
+        '''
+        with self.lock:
+            self.non_fiscal_printout_begin(printout_no, header_no, options)
+
+            with self.batch():
+                buf = bytearray()
+                offset = count = 0
+
+                for index, line in enumerate(lines):
+                    cmd = commands.non_fiscal_printout_line(
+                        (line,) if isinstance(line, str) else line,
+                        printout_no,
+                        line_no,
+                        **line_options
+                    )
+                    pkt = assemble_packet(cmd.command, cmd.parameters, cmd.texts, self.encoding)
+                    buf += pkt
+                    buf += b'\x05'
+                    self._batch.append((cmd.command, pkt))
+                    count += 1
+
+                    if count == chunk_lines:
+                        self._send_chunk(buf, offset)
+                        offset, count = index + 1, 0
+
+                if count:
+                    self._send_chunk(buf, offset)
+
+            self.non_fiscal_printout_close(printout_no, system_no, additional_lines)
+
+    def _send_chunk(self, buf, offset):
+        start = time.perf_counter()
+
+        with self._link():
+            self.conn.write(buf)
+
+        if self.hooks:
+            elapsed = time.perf_counter() - start
+            self._trace('$w', len(buf), elapsed, 0.0, None, elapsed, None, None)
+
+        del buf[:]
+
+        try:
+            self.checkpoint()
+        except BatchError as exc:
+            exc.index += offset
+            raise
+
+    def check_for_errors(self):
+        '''
+        Raise ProtocolError if the last command failed.
+
+        The cheap ENQ status byte is polled first, the full error code (#n)
+        is queried only when its lastcommanderror flag is set.
+        '''
+        if self.enq()['lastcommanderror'] == 'yes':
             err = self.get_error()
             if err != 0:
                 raise ProtocolError(err)
 
-        return reply
-
-    def dle(self):
-        self.conn.write(b'\x10')
-        status = unpack_flags(self.conn.read())[:3]
+    @contextlib.contextmanager
+    def batch(self):
+        '''
+        Defer error checks of fiscal commands until a checkpoint.
+
+        Inside the block, commands sent with check_for_errors are written
+        back-to-back, each followed by an ENQ whose status byte is collected
+        at the next checkpoint: an explicit checkpoint() call, any command
+        reading a reply, any status request (dle, enq, check_for_errors,
+        ping), a transaction close/cancel ($e) or the end of the block.
+        The first status byte with lastcommanderror set pinpoints the
+        failing command, reported as BatchError.
+        '''
+        with self.lock:
+            if self._batch is not None:
+                yield self
+                return
+
+            self._batch = []
+            try:
+                yield self
+                self.checkpoint()
+            finally:
+                self._batch = None
+
+    def checkpoint(self):
+        '''Collect status of the commands sent since the last checkpoint'''
+        with self.lock:
+            if self._batch is None:
+                return
+
+            batch, self._batch = self._batch, []
+
+            if not batch:
+                return
+
+            start = time.perf_counter()
+            error = None
+            try:
+                with self._link():
+                    statuses = self.conn.read(len(batch))
+
+                for index, ((command, pkt), status) in enumerate(zip(batch, statuses)):
+                    if unpack_flags(bytes([status]))[2]:
+                        err = self.get_error()
+                        if err != 0:
+                            raise BatchError(err, index, command, pkt)
+
+                    if self._progress is not None:
+                        self._progress.confirmed += 1
+
+                if len(statuses) != len(batch):
+                    self.close()
+                    raise CommunicationTimeout('No status from printer')
+            except Exception as exc:
+                error = exc
+                raise
+            finally:
+                if self.hooks:
+                    elapsed = time.perf_counter() - start
+                    self._trace('checkpoint', 0, 0.0, 0.0, elapsed, elapsed, error, None)
+
+    def _send_batched(self, command, pkt):
+        start = time.perf_counter()
+
+        with self._link():
+            log.debug('Sending batched command: %s', pkt)
+            # a single write: the packet is never written without its ENQ
+            self.conn.write(bytes(pkt) + b'\x05')
+        self._batch.append((command, pkt))
+
+        elapsed = time.perf_counter() - start
+        self._record_latency(command, elapsed)
+
+        if self.hooks:
+            # the error check is deferred to the checkpoint
+            self._trace(command, len(pkt) + 1, elapsed, 0.0, None, elapsed, None, None)
+
+    def latency_report(self):
+        '''Per command latency statistics (in seconds)'''
         return {
-            'online': yn(status[2]),
-            'papererror': yn(status[1]),
-            'printererror': yn(status[0])
+            command: {
+                'count': count,
+                'avg': total / count,
+                'max': max_
+            }
+            for command, (count, total, max_) in self.latencies.items()
         }
 
+    def _record_latency(self, command, elapsed):
+        count, total, max_ = self.latencies.get(command, (0, 0.0, 0.0))
+        self.latencies[command] = (count + 1, total + elapsed, max(max_, elapsed))
+
+    def _trace(self, command, written, write_time, reply_time, check_time, duration, error, reply):
+        trace = CommandTrace(
+            command, written, write_time, reply_time, check_time, duration,
+            getattr(error, 'error_code', None), error, reply
+        )
+
+        for hook in self.hooks:
+            try:
+                hook(trace)
+            except Exception:
+                log.exception('Instrumentation hook %r failed', hook)
+
+    def _drain(self):
+        '''Drop stale input left over from previous commands'''
+        waiting = self.conn.in_waiting
+        if waiting:
+            log.debug('Dropping stale input: %s', self.conn.read(waiting))
+
+        self._decoder.reset()
+        self._frames.clear()
+
+    def _read_frame(self):
+        '''Return the next reply frame as soon as it is complete'''
+        deadline = time.monotonic() + self.timeout
+
+        while not self._frames:
+            data = self.conn.read(self.conn.in_waiting or 1)
+            self._frames.extend(self._decoder.feed(data))
+
+            if not self._frames and time.monotonic() >= deadline:
+                raise CommunicationTimeout('No reply from printer')
+
+        return self._frames.popleft()
+
+    def _read_status(self, ctrl):
+        with self.lock:
+            if self._batch:
+                # the pending statuses would be dropped with the stale input
+                self.checkpoint()
+
+            start = written = time.perf_counter()
+            error = status = None
+            try:
+                with self._link():
+                    self._drain()
+                    self.conn.write(ctrl)
+                    written = time.perf_counter()
+
+                    for delay in self.status_backoff:
+                        if self.conn.in_waiting:
+                            break
+                        time.sleep(delay)
+
+                    status = self.conn.read()
+
+                    if not status:
+                        raise CommunicationTimeout('No status from printer')
+            except Exception as exc:
+                error = exc
+                raise
+            finally:
+                if self.hooks:
+                    end = time.perf_counter()
+                    self._trace(
+                        STATUS_REQUESTS[ctrl], 1, written - start, end - written,
+                        None, end - start, error, status
+                    )
+
+            return status
+
+    def dle(self):
+        return parse_dle_status(self._read_status(b'\x10'))
+
     def enq(self):
-        self.conn.write(b'\x05')
-        status = unpack_flags(self.conn.read())[:4]
-        return {
-            'fiscal': yn(status[3]),
-            'lastcommanderror': yn(status[2]),
-            'intransaction': yn(status[1]),
-            'lasttransactioncorrect': yn(status[0])
-        }
+        return dict(self._coalesce('ENQ', lambda: parse_enq_status(self._read_status(b'\x05'))))
+
+    def _coalesce(self, key, request):
+        '''
+        Run a read-only request, or wait for the result of an identical one
+        already in progress in another thread (unless this thread holds the
+        device lock, the other one could be waiting for it).
+        '''
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            follower = flight is not None and not self.lock.owned()
+
+            if not follower:
+                flight = self._flights[key] = _Flight()
+
+        if follower:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            with self.lock:
+                try:
+                    flight.result = request()
+                finally:
+                    # before the lock is released: a request joining later
+                    # might follow a command changing the result
+                    with self._flights_lock:
+                        if self._flights.get(key) is flight:
+                            del self._flights[key]
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            flight.done.set()
+
+        return flight.result
 
     def bel(self):
-        self.conn.write(b'\x07')
+        with self._link():
+            self.conn.write(b'\x07')
 
     def can(self):
-        self.conn.write(b'\x18')
+        with self._link():
+            self.conn.write(b'\x18')
 
     def set_error(self, value):
 
@@ -133,449 +798,98 @@ class Printer:
         reply = self.send_command(
             command='#n',
             read_reply=True
-        )[5:-2]
+        )
+
+        return parse_error_reply(reply)
 
-        return int(reply)
+    def cash_register_data(self, mode=21, strict=True):
+        '''
+        Cash register data (#s) in the given mode, parsed by the reply type
 
-    def cash_register_data(self, mode=21):
+        Reply types without a registered layout (see replies.register_reply)
+        raise ReplyNotImplemented, or give RawReply when strict is False.
+        Identical requests from several threads share one round trip.
+        '''
+        return self._coalesce(('#s', mode, strict), lambda: self._cash_register_data(mode, strict))
+
+    def _cash_register_data(self, mode, strict):
         reply = self.send_command(
             command='#s',
             parameters=[str(mode)],
             read_reply=True
         )[2:-2]
 
-        return parse_cash_register_data_reply(reply)
-
-    def taxrates_get(self):
-
-        reply = self.cash_register_data(mode=22)
-
-        tax_rates = [
-            (key[-1], parse_ptu_percentages(val, self.encoding))
-            for key, val in reply.items() if key.startswith('PTU_')
-        ]
-
-        return tax_rates
-
-    def invoice_begin(
-        self,
-        no_of_lines,        
-        customer,
-        nip,
-        number,
-        invoice_type='invoice',
-        signarea=True,
-        copies=0,
-        payment_date=None,
-        margins=True,
-        recipient=None,
-        issuer=None
-    ):
-        customer_lines = customer.split('\n')
-
-        params = [
-            str(no_of_lines), # invoice lines number
-            ';',
-            str(len(customer_lines)), # customer lines number
-            ';',
-            '1' if invoice_type == 'invoice' else '2',
-            ';',
-            '2', # Oryginał / kopia
-            ';',
-            '1' if margins else '0', # upper margin
-            ';',
-            '0', # ignored
-            ';',
-            '255' if copies == 0 else str(copies - 1),
-            ';',
-            '0', # ignored
-            ';',
-            '0', # ignored
-            ';',
-            '0' if signarea else '1',
-            ';',
-            '0' # no country symbol before sellers NIP
-        ]
-
-        texts = [
-            number,
-            '\r',            
-        ]
-
-        for cl in customer_lines:
-            texts += [
-                cl,
-                '\r'
-            ]
-
-        texts += [
-            nip,
-            '\r', 
-            '\r', # payment date
-            '\r'  # payment form
-        ]
-
-        if payment_date is not None:
-            texts += [
-                payment_date,
-                '\r'
-            ]
-
-        if recipient is not None:
-            texts += [
-                recipient,
-                '\r'
-            ]
-
-        if issuer is not None:
-            texts += [
-                issuer,
-                '\r'
-            ]
-
-        texts += [
-            '#',
-            number,
-            '\r',
-            customer_lines[0],
-            '\r'
-        ]        
-
-        self.send_command(
-            command='$h',
-            parameters=params,
-            texts=texts,
-            check_for_errors=True
-        )
-
-    def invoice_cancel(self):    
-        self.send_command(
-            command='$e',
-            parameters=['0'],
-            check_for_errors=True
-        )
-
-    def invoice_close(
-        self,
-        total, 
-        number,       
-        discount=0,
-        cash=0,
-        paid_line='',
-        buyer='',
-        seller=''
-    ):                
-        self.send_command(
-            command='$e',
-            parameters=[
-                '1', # action - 1 commit
-                ';',
-                str(round(discount, 2)), #'0' discount percentage - ignored
-                ';',
-                '0', # additional lines count
-                ';',
-                '1', # how to end transaction - ignored
-                ';',
-                '0', # discount type: 0 - none, 1 - precentage discount, 2 - percentage markup
-                ';',
-                '1', # constant
-                ';',
-                '1' if paid_line else '0',
-                ';',
-                '1' if buyer else '2',
-                ';',
-                '1' if seller else '2'
-            ],
-            texts=[
-                number,
-                '\r',
-                paid_line,
-                '\r',
-                buyer,
-                '\r',
-                seller,
-                '\r',                
-                nmb(cash),
-                '/',
-                nmb(total),
-                '/',
-                '0', # discount
-                '/'
-            ],
-            check_for_errors=True
-        )
-
-    def item(
-        self,
-        line_no,    
-        name,
-        quantity,        
-        ptu,
-        price,
-        plu='',        
-        description='',
-        discount_name='',
-        discount_value=None,
-        discount_descid=16
-    ):
-        params = [str(line_no)]
-        texts = [name, '\r']
-
-        if plu:
-            texts += [plu, '\r']
-
-        texts += [
-            nmb(quantity),
-            '\r',
-            ptu,
-            '/',
-            nmb(price),
-            '/',
-            nmb(price * quantity),
-            '/'
-        ]
-
-        if discount_value is not None:
-            params += [
-                ';',
-                '2' if discount_value.endswith('%') else '1',
-                ';', 
-                str(discount_descid)
-            ]
-
-            texts += [
-                discount_value.strip('%'),
-                '/',
-                discount_name,
-                '\r'
-            ]
-
-        if description:
-            if discount_value is None:
-                params.append(';0;0')                
-
-            params.append(';1')
-            texts += [description, '\r']
-        
-        self.send_command(
-            command='$l',
-            parameters=params,
-            texts=texts,
-            check_for_errors=True
-        )
-
-    def discount(
-        self,
-        value,
-        name
-    ):
-        discount_type = '1' if value.endswith('%') else '3'
-
-        self.send_command(
-            command='$n',
-            parameters=[discount_type],
-            texts=[
-                name,
-                '\r',
-                value.strip('%'),
-                '/'
-            ],
-            check_for_errors=True
-        )
-
-    def markup(
-        self,
-        value,
-        name
-    ):
-        markup_type = '2' if value.endswith('%') else '4'
-
-        self.send_command(
-            command='$n',
-            parameters=[markup_type],
-            texts=[
-                name,
-                '\r',
-                value.strip('%'),
-                '/'
-            ],
-            check_for_errors=True
-        )
-
-    def payment_add(
-        self,
-        type_,
-        value,
-        mode='payment',
-        name=''
-    ):
-        self.send_command(
-            command='$b',
-            parameters=[
-                '1' if mode == 'payment' else '2',
-                ';',
-                PAYMENT_TYPES.get(type_, '4'), # set other, when nothing matches
-            ],
-            texts=[
-                nmb(value),
-                '/',
-                name,
-                '\r'
-            ],
-            check_for_errors=True
-        )
-
-    def receipt_begin(
-        self,
-        lines_count=0, # 0 - online
-        system_identifier='',
-        additional_lines=tuple(),
-        buyer_identifier='',
-        buyer_identifier_type='NIP'
-    ):
-
-        if system_identifier:
-            additional_lines = [
-                system_identifier
-            ] + list(additional_lines)
+        data = parse_cash_register_data_reply(reply, strict)
 
-        params = [
-            str(lines_count),
-            ';', 
-            str(len(additional_lines))
-        ]
+        if isinstance(data, CashRegisterData):
+            self._update_metadata(data)
 
-        texts = [line + '\r' for line in additional_lines]
+        return data
 
-        if buyer_identifier:
-            params += [
-                ';0;',
-                BUYER_IDENTIFIER[buyer_identifier_type],
-                ';',
-                '1'
-            ]
+    def metadata(self):
+        '''
+        Tax rates, serial number, fiscal flag and zeroing count
 
-            texts += [
-                buyer_identifier,
-                '\r'
-            ]
+        Cached for metadata_ttl seconds and refreshed by every #s reply
+        (so a new zeroing count is picked up at once); dropped after
+        reconnects and commands which might change the values.
+        '''
+        if (
+            self._metadata is None
+            or time.monotonic() - self._metadata_time > self.metadata_ttl
+        ):
+            self.cash_register_data(mode=22)
 
-        self.send_command(
-            command='$h',
-            parameters=params,
-            texts=texts,
-            check_for_errors=True
-        )
-
-    receipt_cancel = invoice_cancel
-
-    def receipt_close(
-        self,
-        total,        
-        cashier,
-        discount=0,
-        cash=0
-    ):                
-        self.send_command(
-            command='$e',
-            parameters=['1;0;0;1;1;1',],
-            texts=[
-                cashier,
-                '\r',
-                nmb(cash),
-                '/',
-                nmb(total),
-                '/',
-                nmb(discount),
-                '/'
-            ],
-            check_for_errors=True
-        )
-
-    def open_drawer(self):
-        self.send_command(
-            command='$d',
-            parameters=['1']
-        )
+        return self._metadata
 
-    def non_fiscal_printout_begin(
-        self,
-        printout_no,
-        header_no=0,
-        options=0
-    ):
-        self.send_command(
-            command='$w',
-            parameters=[
-                '0', # constant
-                ';',
-                str(printout_no),
-                ';',
-                str(header_no),
-                ';',
-                str(options)
-            ],
-            check_for_errors=True
-        )
+    def invalidate_metadata(self):
+        self._metadata = None
 
-    def non_fiscal_printout_line(
-        self,
-        args,        
-        printout_no,
-        line_no=0,
-        bold=False,
-        inversed=False,
-        font=0,
-        centered=False,
-        font_attributes=0
-    ):
-        self.send_command(
-            command='$w',
-            parameters=[                
-                str(printout_no),
-                ';',
-                str(line_no),
-                ';',
-                '1' if bold else '0',
-                ';',
-                '1' if inversed else '0',
-                ';',
-                str(font),
-                ';',
-                '1' if centered else '0',
-                ';',
-                str(font_attributes)
-            ],
-            texts=[
-                arg + '\r' for arg in args
-            ],
-            check_for_errors=True
-        )
+    def _update_metadata(self, data):
+        zeroingcount = data.zeroingcount
 
-    def non_fiscal_printout_close(
-        self,
-        printout_no,
-        system_no='',  
-        additional_lines=tuple()
-    ):
-        args = list(additional_lines)
+        if self._metadata is not None and self._metadata['zeroingcount'] != zeroingcount:
+            log.info('Zeroing count changed to %s', zeroingcount)
 
-        if system_no:
-            args.insert(0, system_no)
-            
-        self.send_command(
-            command='$w',
-            parameters=[
-                '1', # constant
-                ';',
-                str(printout_no),
-                ';',
-                '1' if system_no else '0',
-                ';',
-                str(len(additional_lines))
-            ],
-            texts=[
-                arg + '\r' for arg in args
-            ],
-            check_for_errors=True
-        )
\ No newline at end of file
+        self._metadata = {
+            'taxrates': parse_taxrates(data, self.encoding),
+            'serialno': data.serialno,
+            'fiscal': yn(data.fiscal),
+            'zeroingcount': zeroingcount
+        }
+        self._metadata_time = time.monotonic()
+
+    def _cached_taxrates(self):
+        '''Tax rates for validation, only when known without a round trip'''
+        if (
+            self._metadata is None
+            or time.monotonic() - self._metadata_time > self.metadata_ttl
+        ):
+            return None
+
+        return self._metadata['taxrates']
+
+    def taxrates_get(self, cached=True):
+        if not cached:
+            self.invalidate_metadata()
+
+        return list(self.metadata()['taxrates'])
+
+    invoice_begin = _command(commands.invoice_begin, validation.invoice_begin, track=_begin_totals)
+    invoice_cancel = _command(commands.invoice_cancel, track=_end_totals)
+    invoice_close = _command(
+        commands.invoice_close, validation.invoice_close, _check_total, _end_totals
+    )
+    item = _command(commands.item, validation.item, track=_add_item)
+    discount = _command(commands.discount)
+    markup = _command(commands.markup)
+    payment_add = _command(commands.payment_add, validation.payment_add)
+    receipt_begin = _command(commands.receipt_begin, track=_begin_totals)
+    receipt_cancel = _command(commands.receipt_cancel, track=_end_totals)
+    receipt_close = _command(
+        commands.receipt_close, validation.receipt_close, _check_total, _end_totals
+    )
+    open_drawer = _command(commands.open_drawer)
+    non_fiscal_printout_begin = _command(commands.non_fiscal_printout_begin)
+    non_fiscal_printout_line = _command(commands.non_fiscal_printout_line)
+    non_fiscal_printout_close = _command(commands.non_fiscal_printout_close)
@@ -0,0 +1,244 @@
+'''
+Transaction builders
+
+Receipt and Invoice collect items, discounts and payments up front,
+validate the totals locally and render all packets of the transaction
+into a single buffer, which Printer.print_document streams to the device.
+'''
+import abc
+from decimal import Decimal
+
+
+from . import commands, validation
+from .exceptions import ValidationError
+from .helpers import assemble_packet, money, item_value
+
+
+def line_value(price, quantity, discount_value=None):
+    '''Item value after its discount, as validated by the printer'''
+    value = item_value(price, quantity)
+
+    if discount_value is not None:
+        if discount_value.endswith('%'):
+            value -= money(value * Decimal(discount_value.strip('%')) / 100)
+        else:
+            value -= money(discount_value)
+
+    return value
+
+
+class Totals:
+    '''Exact running total of the transaction lines, checked before closing'''
+
+    def __init__(self):
+        self.values = []
+        self.total = money(0)
+
+    def add(self, price, quantity, discount_value=None):
+        value = line_value(price, quantity, discount_value)
+        self.values.append(value)
+        self.total += value
+
+        return value
+
+    def check(self, total=None):
+        if total is None:
+            return self.total
+
+        if money(total) != self.total:
+            raise ValidationError(
+                validation.INVALID_TOTAL,
+                'total',
+                '{} does not match items value {}'.format(money(total), self.total)
+            )
+
+        return money(total)
+
+
+class Transaction(abc.ABC):
+
+    def __init__(self):
+        self.items = []
+        self.adjustments = []
+        self.payments = []
+        self.closing = None
+        self.sent = 0
+        self.confirmed = 0
+        self.totals = Totals()
+
+    @property
+    def total(self):
+        return self.totals.total
+
+    def item(
+        self,
+        name,
+        quantity,
+        ptu,
+        price,
+        plu='',
+        description='',
+        discount_name='',
+        discount_value=None,
+        discount_descid=16
+    ):
+        self._check_open()
+        validation.item(
+            len(self.items) + 1, name, quantity, ptu, price, plu, description,
+            discount_name, discount_value, discount_descid
+        )
+
+        self.items.append(commands.item(
+            line_no=len(self.items) + 1,
+            name=name,
+            quantity=quantity,
+            ptu=ptu,
+            price=price,
+            plu=plu,
+            description=description,
+            discount_name=discount_name,
+            discount_value=discount_value,
+            discount_descid=discount_descid
+        ))
+        self.totals.add(price, quantity, discount_value)
+
+        return self
+
+    def discount(self, value, name):
+        self._check_open()
+        self.adjustments.append(commands.discount(value, name))
+        return self
+
+    def markup(self, value, name):
+        self._check_open()
+        self.adjustments.append(commands.markup(value, name))
+        return self
+
+    def payment_add(self, type_, value, mode='payment', name=''):
+        self._check_open()
+        validation.payment_add(type_, value, mode, name)
+        self.payments.append(commands.payment_add(type_, value, mode, name))
+        return self
+
+    @abc.abstractmethod
+    def begin_command(self):
+        '''Command opening the transaction'''
+
+    def commands(self):
+        if self.closing is None:
+            raise ValueError('Transaction not closed')
+
+        if not self.items:
+            raise ValueError('Transaction has no items')
+
+        return [
+            self.begin_command(),
+            *self.items,
+            *self.adjustments,
+            *self.payments,
+            self.closing
+        ]
+
+    def render(self, encoding='mazovia'):
+        '''
+        Render all packets into one buffer
+
+        Returns the buffer and a list of (command, start, end) frames.
+        '''
+        buf = bytearray()
+        frames = []
+
+        for cmd in self.commands():
+            start = len(buf)
+            buf += assemble_packet(cmd.command, cmd.parameters, cmd.texts, encoding)
+            frames.append((cmd.command, start, len(buf)))
+
+        return buf, frames
+
+    def _check_open(self):
+        if self.closing is not None:
+            raise ValueError('Transaction already closed')
+
+
+class Receipt(Transaction):
+
+    def __init__(
+        self,
+        lines_count=0,
+        system_identifier='',
+        additional_lines=tuple(),
+        buyer_identifier='',
+        buyer_identifier_type='NIP'
+    ):
+        super().__init__()
+        self.begin = commands.receipt_begin(
+            lines_count=lines_count,
+            system_identifier=system_identifier,
+            additional_lines=additional_lines,
+            buyer_identifier=buyer_identifier,
+            buyer_identifier_type=buyer_identifier_type
+        )
+
+    def begin_command(self):
+        return self.begin
+
+    def close(self, *, cashier, total=None, discount=0, cash=0):
+        '''
+        Close the receipt, checking total (when given) against the items
+
+        The arguments are keyword-only: Printer.receipt_close takes the
+        total first.
+        '''
+        self._check_open()
+        total = self.totals.check(total)
+        validation.receipt_close(total, cashier, discount, cash)
+        self.closing = commands.receipt_close(
+            total,
+            cashier,
+            discount=discount,
+            cash=cash
+        )
+        return self
+
+
+class Invoice(Transaction):
+
+    def __init__(self, customer, nip, number, **kwargs):
+        super().__init__()
+        validation.invoice_begin(0, customer, nip, number, **kwargs)
+        self.customer = customer
+        self.nip = nip
+        self.number = number
+        self.options = kwargs
+
+    def begin_command(self):
+        return commands.invoice_begin(
+            no_of_lines=len(self.items),
+            customer=self.customer,
+            nip=self.nip,
+            number=self.number,
+            **self.options
+        )
+
+    def close(
+        self,
+        total=None,
+        discount=0,
+        cash=0,
+        paid_line='',
+        buyer='',
+        seller=''
+    ):
+        self._check_open()
+        total = self.totals.check(total)
+        validation.invoice_close(total, self.number, discount, cash, paid_line, buyer, seller)
+        self.closing = commands.invoice_close(
+            total,
+            self.number,
+            discount=discount,
+            cash=cash,
+            paid_line=paid_line,
+            buyer=buyer,
+            seller=seller
+        )
+        return self
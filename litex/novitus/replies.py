@@ -0,0 +1,212 @@
+'''
+Typed printer replies
+
+Reply layouts are declared as templates of field names separated the same
+way as in the reply ('/' and ';'), compiled once at import time and
+registered by reply type. Replies are split into raw fields once;
+values are converted only when a field is accessed.
+'''
+import datetime
+from collections.abc import Mapping
+from decimal import Decimal
+
+
+from .exceptions import CommunicationError, ReplyNotImplemented
+
+
+PTU_LETTERS = 'ABCDEFG'
+
+
+def flag(val):
+    return val == b'1'
+
+
+def text(val):
+    return val.decode('ascii', 'replace')
+
+
+def amount(val):
+    return Decimal(val.decode('ascii'))
+
+
+class ReplyLayout:
+    '''
+    Compiled reply layout
+
+    template names the fields in order, separated with '/' or ';' as in
+    the reply, '-' marks ignored fields. The reply is split on '/' first,
+    groups of ';' separated fields are split only when one of them is read.
+    converters maps field names to functions converting the raw bytes.
+    '''
+
+    def __init__(self, template, converters=None):
+        self.index = {}
+        groups = template.split('/')
+
+        for group_no, group in enumerate(groups):
+            names = group.split(';')
+            for field_no, name in enumerate(names):
+                if name != '-':
+                    self.index[name] = (group_no, field_no if len(names) > 1 else None)
+
+        self.keys = tuple(self.index)
+        self.splits = len(groups) - 1
+        self.converters = dict(converters or {})
+
+
+def _field_property(name, convert):
+    return property(lambda self: convert(self.raw(name)), doc=name)
+
+
+class Reply(Mapping):
+    '''
+    Reply parsed according to a layout
+
+    Converted values are available as attributes, raw bytes of the fields
+    also by name: a reply is a read-only mapping of the field names to
+    their raw values (reply['PTU_A']), equal to a dict of them.
+    '''
+    __slots__ = ('_groups', '_split')
+
+    layout = ReplyLayout('')
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        for name, convert in cls.layout.converters.items():
+            if name not in cls.__dict__:
+                setattr(cls, name, _field_property(name, convert))
+
+    def __init__(self, body):
+        self._groups = bytes(body).split(b'/', self.layout.splits)
+        self._split = {}
+
+        if len(self._groups) != self.layout.splits + 1:
+            raise CommunicationError('Malformed {} reply'.format(type(self).__name__))
+
+    def raw(self, name):
+        group_no, field_no = self.layout.index[name]
+
+        if field_no is None:
+            return self._groups[group_no]
+
+        fields = self._split.get(group_no)
+        if fields is None:
+            fields = self._split[group_no] = self._groups[group_no].split(b';')
+
+        return fields[field_no]
+
+    # Mapping of the raw fields
+
+    def __getitem__(self, name):
+        try:
+            return self.raw(name)
+        except (KeyError, IndexError):
+            raise KeyError(name)
+
+    def __contains__(self, name):
+        return name in self.layout.index
+
+    def __iter__(self):
+        return iter(self.layout.keys)
+
+    def __len__(self):
+        return len(self.layout.keys)
+
+
+class RawReply:
+    '''Reply of a type without a registered layout: fields only split'''
+    __slots__ = ('type', 'fields')
+
+    def __init__(self, type_, body):
+        self.type = type_
+        self.fields = [group.split(b';') for group in bytes(body).split(b'/')]
+
+    def __repr__(self):
+        return '<RawReply {!r} {!r}>'.format(self.type, self.fields)
+
+
+class CashRegisterData(Reply):
+    '''Cash register data (#s reply of type 2#X)'''
+    __slots__ = ()
+
+    layout = ReplyLayout(
+        'lastcommanderror;fiscal;intransaction;lasttransactionerror;-;'
+        'zeroingcount;year;month;day/'
+        + '/'.join('PTU_' + letter for letter in PTU_LETTERS) + '/'
+        'receiptcount/'
+        + '/'.join('TOT_' + letter for letter in PTU_LETTERS) + '/'
+        'cash/serialno',
+        {
+            'lastcommanderror': flag,
+            'fiscal': flag,
+            'intransaction': flag,
+            'lasttransactionerror': flag,
+            'zeroingcount': int,
+            'receiptcount': int,
+            'cash': amount,
+            'serialno': text
+        }
+    )
+
+    def __repr__(self):
+        return '<CashRegisterData serialno={!r} receiptcount={}>'.format(
+            self.serialno, self.receiptcount
+        )
+
+    @property
+    def date(self):
+        return datetime.date(
+            2000 + int(self.raw('year')),
+            int(self.raw('month')),
+            int(self.raw('day'))
+        )
+
+    @property
+    def tax_rates(self):
+        '''PTU letter -> percentage (100.00 tax free, 101.00 unused)'''
+        return {letter: amount(self.raw('PTU_' + letter)) for letter in PTU_LETTERS}
+
+    @property
+    def totals(self):
+        '''PTU letter -> sales total'''
+        return {letter: amount(self.raw('TOT_' + letter)) for letter in PTU_LETTERS}
+
+
+# Reply type -> Reply class
+# TODO: layouts of the other #s modes (counters, device info, last receipt
+# number), to be declared from the protocol document
+REPLY_TYPES = {
+    b'2#X': CashRegisterData
+}
+
+
+def register_reply(type_, template, converters=None, name=None):
+    '''Declare the layout of a reply type, returns the Reply class'''
+    cls = type(
+        name or 'Reply_' + type_.decode('ascii').replace('#', ''),
+        (Reply,),
+        {'__slots__': (), 'layout': ReplyLayout(template, converters)}
+    )
+    REPLY_TYPES[type_] = cls
+
+    return cls
+
+
+def parse_reply(pkt, strict=True):
+    '''
+    Parse a reply body (without ESC P, ESC \\\\ and the checksum) by its type
+
+    Unregistered types raise ReplyNotImplemented, or give RawReply when
+    strict is False.
+    '''
+    type_ = bytes(pkt[:3])
+    cls = REPLY_TYPES.get(type_)
+
+    if cls is not None:
+        return cls(pkt[3:])
+
+    if strict:
+        raise ReplyNotImplemented(type_)
+
+    return RawReply(type_, pkt[3:])
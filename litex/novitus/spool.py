@@ -0,0 +1,394 @@
+'''
+Durable job spool
+
+Transactions are journaled to an append-only file before they are
+printed, and a Dispatcher thread drains the spool to the printer, so the
+caller returns as soon as the job is on disk:
+
+    spool = Spool('/var/spool/novitus/lane1.journal')
+    Dispatcher(spool, printer).start()
+    spool.submit(receipt)
+
+Every job moves queued -> sent -> confirmed (or failed, when the printer
+rejects it). Before a job is printed, the receipt counter of the printer
+is journaled with its sent state; after a crash or a lost link the
+counter tells a printed job (confirmed without printing it again) from
+one which has to be printed again, so no transaction is registered twice.
+'''
+import json
+import logging
+import os
+import threading
+import uuid
+
+
+from .commands import Command
+from .exceptions import CommunicationError, ProtocolError
+from .receipt import Transaction
+
+
+log = logging.getLogger(__name__)
+
+
+QUEUED = 'queued'
+SENT = 'sent'
+CONFIRMED = 'confirmed'
+FAILED = 'failed'
+
+FINISHED = frozenset([CONFIRMED, FAILED])
+
+
+class Job:
+    '''Spooled transaction, printable with Printer.print_document'''
+
+    def __init__(self, id_, commands, state=QUEUED):
+        self.id = id_
+        self.state = state
+        self.receiptcount = None
+        self.error_code = None
+        self.sent = 0
+        self.confirmed = 0
+        self._commands = commands
+
+    def __repr__(self):
+        return '<Job {} {}>'.format(self.id, self.state)
+
+    def commands(self):
+        return self._commands
+
+    render = Transaction.render
+
+    def records(self):
+        '''Journal records restoring the job'''
+        yield {
+            'job': self.id,
+            'state': QUEUED,
+            'commands': [list(cmd) for cmd in self._commands]
+        }
+
+        if self.state != QUEUED:
+            yield self.state_record()
+
+    def state_record(self):
+        record = {'job': self.id, 'state': self.state}
+
+        if self.receiptcount is not None:
+            record['receiptcount'] = self.receiptcount
+        if self.error_code is not None:
+            record['error_code'] = self.error_code
+
+        return record
+
+
+class Spool:
+    '''
+    Journal of jobs
+
+    Appends are flushed at once and fsynced in groups: a durable submit
+    waits for an fsync covering its record, concurrent submits share it.
+    Finished jobs are dropped from the journal by compaction, after
+    compact_threshold of them accumulate; their ids and final states are
+    kept (in done) as short tombstone records, so a compacted job is not
+    queued again and can still be waited for.
+    '''
+
+    def __init__(self, path, compact_threshold=1000):
+        self.path = path
+        self.compact_threshold = compact_threshold
+        self.jobs = {}
+        self.done = {}
+        self._finished = 0
+        self._written = 0
+        self._synced = 0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._closed = False
+
+        self._replay()
+        self._file = open(self.path, 'ab')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _replay(self):
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'r+b') as journal:
+            offset = 0
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # torn write of the last record
+                    log.warning('Truncating journal %s at %s', self.path, offset)
+                    journal.truncate(offset)
+                    break
+
+                self._apply(record)
+                offset += len(line)
+
+                if not line.endswith(b'\n'):
+                    # complete last record torn before its line end
+                    journal.seek(offset)
+                    journal.write(b'\n')
+                    break
+
+    def _apply(self, record):
+        state = record['state']
+
+        if 'commands' in record:
+            job = self.jobs[record['job']] = Job(
+                record['job'],
+                [Command(*cmd) for cmd in record['commands']]
+            )
+        elif record['job'] in self.jobs:
+            job = self.jobs[record['job']]
+        else:
+            # tombstone of a compacted job
+            self.done[record['job']] = state
+            return None
+
+        job.state = state
+        job.receiptcount = record.get('receiptcount', job.receiptcount)
+        job.error_code = record.get('error_code', job.error_code)
+
+        if state in FINISHED:
+            self._finished += 1
+
+        return job
+
+    def _append(self, record):
+        self._file.write(json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n')
+        self._file.flush()
+        self._written += 1
+
+        return self._written
+
+    def sync(self, upto=None):
+        '''fsync the journal, unless an fsync since record upto was written'''
+        with self._sync_lock:
+            with self._lock:
+                if upto is not None and self._synced >= upto:
+                    return
+                written = self._written
+                fd = self._file.fileno()
+
+            os.fsync(fd)
+            self._synced = max(self._synced, written)
+
+    def submit(self, document, job_id=None, durable=True):
+        '''
+        Journal a closed transaction (Receipt, Invoice), returns the job id
+
+        A job_id already in the spool is not queued again, so a submit
+        retried by the caller does not print twice.
+        '''
+        commands = [Command(*cmd) for cmd in document.commands()]
+
+        with self._changed:
+            if self._closed:
+                raise ValueError('Spool closed')
+
+            job_id = job_id or uuid.uuid4().hex
+            if job_id in self.jobs or job_id in self.done:
+                return job_id
+
+            job = self.jobs[job_id] = Job(job_id, commands)
+            seq = self._append(next(job.records()))
+            self._changed.notify_all()
+
+        if durable:
+            self.sync(seq)
+
+        return job_id
+
+    def set_state(self, job, state, receiptcount=None, error_code=None):
+        '''Journal a state change, durably before it is acted upon'''
+        with self._changed:
+            job.state = state
+            if receiptcount is not None:
+                job.receiptcount = receiptcount
+            job.error_code = error_code
+            seq = self._append(job.state_record())
+
+            if state in FINISHED:
+                self._finished += 1
+
+            self._changed.notify_all()
+
+        self.sync(seq)
+
+        if self._finished >= self.compact_threshold:
+            self.compact()
+
+    def pending(self):
+        with self._lock:
+            return [job for job in self.jobs.values() if job.state not in FINISHED]
+
+    def next_job(self, timeout=None):
+        '''The oldest unfinished job, waiting up to timeout for one'''
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self._closed or any(
+                    job.state not in FINISHED for job in self.jobs.values()
+                ),
+                timeout
+            )
+
+            for job in self.jobs.values():
+                if job.state not in FINISHED:
+                    return job
+
+    def wait(self, job_id, timeout=None):
+        '''Wait until the job is confirmed or failed, returns its state'''
+        with self._changed:
+            if job_id in self.done:
+                return self.done[job_id]
+
+            job = self.jobs[job_id]
+            self._changed.wait_for(lambda: job.state in FINISHED or self._closed, timeout)
+
+            return job.state
+
+    def compact(self):
+        '''Rewrite the journal with the unfinished jobs and tombstones only'''
+        tmp = self.path + '.tmp'
+
+        with self._sync_lock, self._lock:
+            live = {}
+            for job_id, job in self.jobs.items():
+                if job.state in FINISHED:
+                    self.done[job_id] = job.state
+                else:
+                    live[job_id] = job
+
+            records = [{'job': job_id, 'state': state} for job_id, state in self.done.items()]
+            records += [record for job in live.values() for record in job.records()]
+
+            with open(tmp, 'wb') as journal:
+                for record in records:
+                    journal.write(
+                        json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n'
+                    )
+                journal.flush()
+                os.fsync(journal.fileno())
+
+            self._file.close()
+            os.replace(tmp, self.path)
+            self._fsync_dir()
+            self._file = open(self.path, 'ab')
+
+            self.jobs = live
+            self._finished = 0
+            self._synced = self._written
+
+    def _fsync_dir(self):
+        if not hasattr(os, 'O_DIRECTORY'):
+            return
+
+        fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        with self._changed:
+            self._closed = True
+            self._changed.notify_all()
+
+        self.sync()
+        self._file.close()
+
+
+class Dispatcher(threading.Thread):
+    '''
+    Print the jobs of a spool one by one
+
+    The printer must not be used by anything else while the dispatcher
+    runs. Jobs interrupted by communication errors are retried every
+    retry_interval seconds; jobs rejected by the printer are cancelled
+    and marked failed.
+    '''
+
+    def __init__(self, spool, printer, retry_interval=1):
+        super().__init__(name='novitus-spool-{}'.format(printer.url), daemon=True)
+        self.spool = spool
+        self.printer = printer
+        self.retry_interval = retry_interval
+        self._stopped = threading.Event()
+
+    def stop(self, wait=True):
+        self._stopped.set()
+
+        if wait and self.is_alive():
+            self.join()
+
+    def run(self):
+        while not self._stopped.is_set():
+            job = self.spool.next_job(timeout=0.1)
+
+            if job is None:
+                continue
+
+            try:
+                self.dispatch(job)
+            except CommunicationError as exc:
+                log.warning('Job %s interrupted: %s', job.id, exc)
+                self._stopped.wait(self.retry_interval)
+
+    def dispatch(self, job):
+        if job.state == SENT and not self.recover(job):
+            return
+
+        printer = self.printer
+        receiptcount = printer.cash_register_data(mode=22).receiptcount
+        self.spool.set_state(job, SENT, receiptcount=receiptcount)
+
+        try:
+            printer.print_document(job)
+        except ProtocolError as exc:
+            log.error('Job %s rejected: %s', job.id, exc)
+            self._cancel()
+            self.spool.set_state(job, FAILED, error_code=exc.error_code)
+            return
+
+        self.spool.set_state(job, CONFIRMED)
+
+    def recover(self, job):
+        '''
+        Settle a job which might have been printed
+
+        Returns False when the receipt counter shows it was printed (the
+        job is confirmed), True when it has to be printed again.
+        '''
+        printer = self.printer
+
+        if not printer.ping():
+            printer.reconnect()
+
+        if printer.enq()['lastcommanderror'] == 'yes':
+            printer.get_error()
+
+        data = printer.cash_register_data(mode=22)
+
+        if job.receiptcount is not None and data.receiptcount > job.receiptcount:
+            log.info('Job %s found printed', job.id)
+            self.spool.set_state(job, CONFIRMED)
+            return False
+
+        if data.intransaction:
+            self._cancel()
+
+        return True
+
+    def _cancel(self):
+        try:
+            self.printer.receipt_cancel()
+        except ProtocolError as exc:
+            log.warning('Cancelling the transaction failed: %s', exc)
@@ -0,0 +1,54 @@
+'''
+Command instrumentation
+
+Callables in Printer.hooks receive a CommandTrace after every command,
+status byte (DLE, ENQ) exchange and batch checkpoint. With no hooks
+attached nothing is built, so the cost is a few timer reads per command.
+
+    printer.hooks.append(lambda trace: print(trace.command, trace.duration))
+'''
+import time
+from collections import namedtuple
+
+
+CommandTrace = namedtuple('CommandTrace', [
+    'command',      # command code, 'DLE', 'ENQ' or 'checkpoint'
+    'written',      # bytes written
+    'write_time',   # seconds spent writing
+    'reply_time',   # seconds spent waiting for the reply (0 if none read)
+    'check_time',   # seconds spent on the error check (None if not checked)
+    'duration',     # seconds in total
+    'error_code',   # ProtocolError code, None on success
+    'error',        # exception raised, None on success
+    'reply'         # reply bytes, None if none read
+])
+
+
+class SpanHook:
+    '''
+    Report traces as spans of an OpenTelemetry compatible tracer
+
+    Only start_span(name, start_time=, attributes=), span.record_exception
+    and span.end(end_time=) are used, so opentelemetry is not required.
+    '''
+
+    def __init__(self, tracer, prefix='novitus'):
+        self.tracer = tracer
+        self.prefix = prefix
+
+    def __call__(self, trace):
+        end = time.time_ns()
+        attributes = {
+            'novitus.{}'.format(name): value
+            for name, value in trace._asdict().items()
+            if name not in ('error', 'reply') and value is not None
+        }
+
+        span = self.tracer.start_span(
+            '{} {}'.format(self.prefix, trace.command),
+            start_time=end - int(trace.duration * 1e9),
+            attributes=attributes
+        )
+        if trace.error is not None:
+            span.record_exception(trace.error)
+        span.end(end_time=end)
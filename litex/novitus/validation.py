@@ -0,0 +1,178 @@
+'''
+Client side validation
+
+Checks the command arguments which the printer would reject with the
+error codes from exceptions.error_codes, before anything is sent.
+The validators take the arguments of the commands functions of the same
+name, plus the encoding of the texts and the tax rates (as returned by
+Printer.taxrates_get) when known.
+'''
+from decimal import Decimal
+
+
+from .exceptions import ValidationError
+from .helpers import money, item_value, encoder
+from .replies import PTU_LETTERS
+
+
+NAME_LENGTH = 40
+TEXT_LENGTH = 40
+MIN_AMOUNT = Decimal('0.01')
+MAX_QUANTITY = Decimal('99999.99')
+MAX_AMOUNT = Decimal('99999999.99')
+
+
+INVALID_NAME = 16
+INVALID_QUANTITY = 17
+INVALID_PTU = 18
+INVALID_PRICE = 19
+INVALID_VALUE = 20
+INVALID_CASHIER = 25
+INVALID_PAYMENT = 26
+INVALID_TOTAL = 27
+INVALID_TEXT = 34
+
+
+def check_text(value, code, field, encoding=None, max_length=TEXT_LENGTH, required=False):
+    if not value:
+        if required:
+            raise ValidationError(code, field, 'empty')
+        return
+
+    if len(value) > max_length:
+        raise ValidationError(code, field, 'longer than {} characters'.format(max_length))
+
+    if '\r' in value or '\x1b' in value:
+        raise ValidationError(code, field, 'control characters not allowed')
+
+    if encoding is not None:
+        try:
+            encoder(encoding)(value)
+        except UnicodeEncodeError as exc:
+            raise ValidationError(
+                code, field, '{!r} not available in {}'.format(exc.object[exc.start], encoding)
+            )
+
+
+def check_amount(value, code, field, minimum=MIN_AMOUNT, maximum=MAX_AMOUNT):
+    try:
+        value = money(value)
+    except (TypeError, ValueError, ArithmeticError):
+        raise ValidationError(code, field, 'not a number')
+
+    if not value.is_finite():
+        raise ValidationError(code, field, 'not a number')
+
+    if not minimum <= value <= maximum:
+        raise ValidationError(
+            code, field, '{} out of range {} - {}'.format(value, minimum, maximum)
+        )
+
+
+def check_ptu(ptu, taxrates=None):
+    if ptu not in PTU_LETTERS or len(ptu) != 1:
+        raise ValidationError(INVALID_PTU, 'ptu', 'unknown letter {!r}'.format(ptu))
+
+    if taxrates is not None and dict(taxrates).get(ptu) == 'unused':
+        raise ValidationError(INVALID_PTU, 'ptu', 'rate {} is not used'.format(ptu))
+
+
+def check_discount(value, code, field):
+    if value is None:
+        return
+
+    try:
+        number = Decimal(value.strip('%'))
+    except (AttributeError, ArithmeticError):
+        raise ValidationError(code, field, 'not a number or percentage')
+
+    if not number.is_finite():
+        raise ValidationError(code, field, 'not a number or percentage')
+
+    maximum = Decimal('99.99') if value.endswith('%') else MAX_AMOUNT
+    if not 0 < number <= maximum:
+        raise ValidationError(code, field, '{} out of range'.format(value))
+
+
+def item(
+    line_no,
+    name,
+    quantity,
+    ptu,
+    price,
+    plu='',
+    description='',
+    discount_name='',
+    discount_value=None,
+    discount_descid=16,
+    encoding=None,
+    taxrates=None
+):
+    check_text(name, INVALID_NAME, 'name', encoding, NAME_LENGTH, required=True)
+    check_text(plu, INVALID_NAME, 'plu', encoding)
+    check_text(description, INVALID_TEXT, 'description', encoding)
+    check_text(discount_name, INVALID_TEXT, 'discount_name', encoding)
+    check_amount(quantity, INVALID_QUANTITY, 'quantity', maximum=MAX_QUANTITY)
+    check_amount(price, INVALID_PRICE, 'price')
+    check_amount(item_value(price, quantity), INVALID_VALUE, 'value')
+    check_ptu(ptu, taxrates)
+    check_discount(discount_value, INVALID_VALUE, 'discount_value')
+
+
+def payment_add(type_, value, mode='payment', name='', encoding=None, taxrates=None):
+    check_amount(value, INVALID_PAYMENT, 'value')
+    check_text(name, INVALID_TEXT, 'name', encoding)
+
+
+def receipt_close(total, cashier, discount=0, cash=0, encoding=None, taxrates=None):
+    check_amount(total, INVALID_TOTAL, 'total', minimum=0)
+    check_amount(cash, INVALID_PAYMENT, 'cash', minimum=0)
+    check_amount(discount, INVALID_TOTAL, 'discount', minimum=0)
+    check_text(cashier, INVALID_CASHIER, 'cashier', encoding, 32)
+
+
+def invoice_begin(
+    no_of_lines,
+    customer,
+    nip,
+    number,
+    invoice_type='invoice',
+    signarea=True,
+    copies=0,
+    payment_date=None,
+    margins=True,
+    recipient=None,
+    issuer=None,
+    encoding=None,
+    taxrates=None
+):
+    check_text(number, INVALID_TEXT, 'number', encoding, required=True)
+    check_text(nip, INVALID_TEXT, 'nip', encoding, 20, required=True)
+
+    if not customer.strip():
+        raise ValidationError(INVALID_TEXT, 'customer', 'empty')
+
+    for line in customer.split('\n'):
+        check_text(line, INVALID_TEXT, 'customer', encoding)
+
+    for field, value in (('recipient', recipient), ('issuer', issuer), ('payment_date', payment_date)):
+        check_text(value, INVALID_TEXT, field, encoding)
+
+
+def invoice_close(
+    total,
+    number,
+    discount=0,
+    cash=0,
+    paid_line='',
+    buyer='',
+    seller='',
+    encoding=None,
+    taxrates=None
+):
+    check_amount(total, INVALID_TOTAL, 'total', minimum=0)
+    check_amount(cash, INVALID_PAYMENT, 'cash', minimum=0)
+    check_text(number, INVALID_TEXT, 'number', encoding, required=True)
+
+    for field, value in (('paid_line', paid_line), ('buyer', buyer), ('seller', seller)):
+        check_text(value, INVALID_TEXT, field, encoding)
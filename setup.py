@@ -23,5 +23,8 @@ setup(
     zip_safe=False,
     install_requires=[
         'pyserial'
-    ]
+    ],
+    extras_require={
+        'asyncio': ['pyserial-asyncio']
+    }
 )
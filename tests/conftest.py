@@ -4,6 +4,88 @@ import os
 from pytest import fixture
 
 
+class FakeConnection:
+    '''
+    Minimal serial connection stand-in answering DLE, ENQ and #n
+
+    Packets for which fail(packet) returns non-zero set the error code,
+    which is latched until read with #n.
+    '''
+
+    def __init__(self):
+        self.written = []
+        self.error = 0
+        self.last_command_failed = False
+        self.in_transaction = False
+        self.last_transaction_correct = True
+        self.fail = lambda pkt: 0
+        self.dle_status = b'\x04'
+        self._buffer = bytearray()
+
+    @property
+    def in_waiting(self):
+        return len(self._buffer)
+
+    def write(self, data):
+        data = bytes(data)
+
+        while data:
+            if data.startswith(b'\x1bP'):
+                end = data.index(b'\x1b\\') + 2
+                self.handle_packet(data[:end])
+            else:
+                end = 1
+                self.handle_control(data[:1])
+
+            data = data[end:]
+
+    def handle_control(self, ctrl):
+        self.written.append(ctrl)
+
+        if ctrl == b'\x10':
+            self._buffer += self.dle_status
+        elif ctrl == b'\x05':
+            self._buffer += bytes([
+                0x08
+                | (0x04 if self.last_command_failed else 0)
+                | (0x02 if self.in_transaction else 0)
+                | (0x01 if self.last_transaction_correct else 0)
+            ])
+
+    def handle_packet(self, pkt):
+        self.written.append(pkt)
+
+        if pkt.startswith(b'\x1bP#n'):
+            self._buffer += b'\x1bP1#E' + str(self.error).encode() + b'\x1b\\'
+            self.error = 0
+            self.last_command_failed = False
+        else:
+            error = self.fail(pkt)
+            self.last_command_failed = error != 0
+            self.error = error or self.error
+
+            if not error and b'$h' in pkt:
+                self.in_transaction = True
+            elif not error and b'$e' in pkt:
+                self.in_transaction = False
+
+    def read(self, size=1):
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def reset_input_buffer(self):
+        self._buffer.clear()
+
+    def read_until(self, expected, size=None):
+        idx = self._buffer.find(expected)
+        end = len(self._buffer) if idx == -1 else idx + len(expected)
+        return self.read(end)
+
+    def close(self):
+        pass
+
+
 @fixture
 def printer():
     from litex.novitus import Printer
@@ -12,3 +94,45 @@ def printer():
         os.environ.get('NOVITUS_URL', 'hwgrep://.*Novitus.*'),
         encoding='cp1250'
     )
+
+
+@fixture
+def fake_connection_factory():
+    return FakeConnection
+
+
+@fixture
+def fake_printer_factory():
+    from litex.novitus import Printer
+
+    def factory(url='loop://', **kwargs):
+        kwargs.setdefault('encoding', 'cp1250')
+        printer = Printer(url, **kwargs)
+        printer._conn = FakeConnection()
+
+        return printer
+
+    return factory
+
+
+@fixture
+def fake_printer(fake_printer_factory):
+    return fake_printer_factory()
+
+
+@fixture
+def emulator():
+    from litex.novitus.emulator import Emulator
+
+    return Emulator()
+
+
+@fixture
+def emulated_printer(emulator):
+    from litex.novitus import Printer
+    from litex.novitus.emulator import TCPTransport
+
+    with TCPTransport(emulator) as transport:
+        printer = Printer(transport.url, timeout=2, encoding='cp1250')
+        yield printer
+        printer.close()
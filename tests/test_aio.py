@@ -0,0 +1,120 @@
+import asyncio
+
+
+import pytest
+
+
+from litex.novitus import Receipt
+from litex.novitus.aio import AsyncPrinter
+from litex.novitus.exceptions import CommunicationError, CommunicationTimeout, ProtocolError
+
+
+async def _serve(conn):
+    async def handle(reader, writer):
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                break
+            conn.write(data)
+            writer.write(conn.read(conn.in_waiting))
+            await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+
+    return server, 'socket://127.0.0.1:{}'.format(port)
+
+
+def test_async_receipt(fake_connection_factory):
+    conn = fake_connection_factory()
+
+    async def run():
+        server, url = await _serve(conn)
+        async with server, AsyncPrinter(url, timeout=1, encoding='cp1250') as printer:
+            await printer.receipt_begin()
+            await printer.item(line_no=1, name='Item', quantity=2, ptu='A', price=4)
+            await printer.receipt_close(8, 'John Doe')
+            return await printer.enq()
+
+    assert asyncio.run(run())['fiscal'] == 'yes'
+    assert conn.written.count(b'\x05') == 4
+
+
+def test_async_protocol_error(fake_connection_factory):
+    conn = fake_connection_factory()
+    conn.fail = lambda pkt: 19
+
+    async def run():
+        server, url = await _serve(conn)
+        async with server, AsyncPrinter(url, timeout=1, encoding='cp1250') as printer:
+            await printer.item(line_no=1, name='Item', quantity=2, ptu='A', price=4)
+
+    with pytest.raises(ProtocolError):
+        asyncio.run(run())
+
+
+def test_async_timeout_drops_connection(fake_connection_factory):
+    conn = fake_connection_factory()
+    conn.handle_control = lambda ctrl: conn.written.append(ctrl)
+
+    async def run():
+        server, url = await _serve(conn)
+        async with server, AsyncPrinter(url, timeout=0.1, encoding='cp1250') as printer:
+            with pytest.raises(CommunicationTimeout):
+                await printer.enq()
+            return printer._writer
+
+    assert asyncio.run(run()) is None
+
+
+def test_async_documents_are_not_interleaved(fake_connection_factory):
+    conn = fake_connection_factory()
+    receipt = Receipt().item(name='Item', quantity=2, ptu='A', price=4).close(cashier='John Doe')
+
+    async def run():
+        server, url = await _serve(conn)
+        async with server, AsyncPrinter(url, timeout=1, encoding='cp1250') as printer:
+            await asyncio.gather(printer.print_document(receipt), printer.open_drawer())
+
+    asyncio.run(run())
+    commands = [pkt.split(b'$')[1][:1] for pkt in conn.written if b'$' in pkt]
+
+    assert commands == [b'h', b'l', b'e', b'd']
+
+
+def test_async_lost_link_reconnects(fake_connection_factory):
+    conn = fake_connection_factory()
+
+    class BrokenWriter:
+        def write(self, data):
+            pass
+
+        async def drain(self):
+            raise ConnectionResetError('connection reset by peer')
+
+        def close(self):
+            pass
+
+    async def run():
+        server, url = await _serve(conn)
+        async with server, AsyncPrinter(url, timeout=1, encoding='cp1250') as printer:
+            printer._writer = BrokenWriter()
+            with pytest.raises(CommunicationError):
+                await printer.bel()
+            return await printer.enq()
+
+    assert asyncio.run(run())['fiscal'] == 'yes'
+
+
+def test_async_printer_created_outside_loop(fake_connection_factory):
+    conn = fake_connection_factory()
+    printer = AsyncPrinter('socket://127.0.0.1:0', timeout=1, encoding='cp1250')
+
+    async def run():
+        server, url = await _serve(conn)
+        printer.url = url
+        async with server, printer:
+            await asyncio.gather(printer.enq(), printer.dle(), printer.enq())
+
+    asyncio.run(run())
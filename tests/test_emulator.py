@@ -0,0 +1,52 @@
+import os
+
+
+import pytest
+
+
+from litex.novitus import Printer
+from litex.novitus.emulator import PTYTransport
+from litex.novitus.exceptions import ProtocolError
+
+
+def test_receipt(emulated_printer, emulator):
+    emulated_printer.receipt_begin(system_identifier='1/TEST/2020')
+    emulated_printer.item(line_no=1, name='Test zażółć', quantity=2, ptu='A', price=4)
+    emulated_printer.item(line_no=2, name='Test', quantity=3, ptu='A', price=0.33)
+    emulated_printer.receipt_close(8.99, 'John Doe')
+
+    assert emulator.receipt_count == 1
+    assert emulated_printer.enq()['intransaction'] == 'no'
+
+
+def test_item_outside_transaction(emulated_printer):
+    with pytest.raises(ProtocolError) as exc:
+        emulated_printer.item(line_no=1, name='Test', quantity=1, ptu='A', price=1)
+
+    assert exc.value.error_code == 21
+
+
+def test_injected_error(emulated_printer, emulator):
+    emulator.errors['$l'] = lambda body: 19 if b'Broken' in body else 0
+    emulated_printer.receipt_begin()
+    emulated_printer.item(line_no=1, name='Fine', quantity=1, ptu='A', price=1)
+
+    with pytest.raises(ProtocolError) as exc:
+        emulated_printer.item(line_no=2, name='Broken', quantity=1, ptu='A', price=1)
+
+    assert exc.value.error_code == 19
+
+
+def test_taxrates_and_status(emulated_printer, emulator):
+    assert emulated_printer.taxrates_get()[:2] == [('A', '23.00%'), ('B', '8.00%')]
+    assert emulated_printer.cash_register_data()['serialno'] == emulator.serialno.encode()
+    assert emulated_printer.dle()['online'] == 'yes'
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='pseudo terminals need POSIX')
+def test_pty_transport(emulator):
+    with PTYTransport(emulator) as transport:
+        printer = Printer(transport.url, timeout=2, encoding='cp1250')
+        printer.receipt_cancel()
+        assert printer.enq()['fiscal'] == 'yes'
+        printer.close()
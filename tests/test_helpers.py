@@ -1,4 +1,19 @@
-from litex.novitus import unpack_flags, assemble_packet, nmb, parse_cash_register_data_reply
+import codecs
+from datetime import date
+from decimal import Decimal
+
+
+import pytest
+
+
+from litex.novitus import (
+    unpack_flags, assemble_packet, nmb, parse_cash_register_data_reply, register_reply
+)
+from litex.novitus.helpers import (
+    packet_template, checksum, xor, Checksum, encoder, decoder, FrameDecoder, verify_frame,
+    item_value
+)
+from litex.novitus.replies import REPLY_TYPES, parse_reply
 
 
 def test_unpack_flags():
@@ -17,4 +32,107 @@ def test_assemble_packet_crc():
 def test_parse_cash_register_data_reply():
     assert 'PTU_A' in parse_cash_register_data_reply(
         b'2#X0;1;0;1;1;0;20;07;23/23.00/08.00/05.00/00.00/100.00/101.00/101.00/169/810.19/0.00/0.00/0.00/0.00/0.00/0.00/0.00/ABC1234567890F1'
-    )
\ No newline at end of file
+    )
+
+
+def test_packet_template_matches_full_checksum():
+    texts = ['Test zażółć gęślą jaźń', '\r', '2.00', '\r', 'A', '/', '4.00', '/', '8.00', '/']
+    pkt = packet_template('$l', '1', 'cp1250').render(texts)
+    body = ('1$l' + ''.join(texts)).encode('cp1250')
+
+    assert pkt == b'\x1bP' + body + checksum(body, 'cp1250') + b'\x1b\\'
+
+
+def test_xor_folding():
+    for size in (0, 1, 63, 64, 65, 100, 1024):
+        data = bytes(range(7, 7 + size % 200)) * (size // 200 + 1)
+        data = data[:size]
+        expected = 255
+        for el in data:
+            expected ^= el
+
+        assert xor(data, 255) == expected
+        assert xor(memoryview(data), 255) == expected
+
+
+def test_incremental_checksum():
+    pkt = 'Zażółć gęślą jaźń\r'.encode('cp1250') * 10
+    chk = Checksum()
+    for pos in range(0, len(pkt), 7):
+        chk.update(pkt[pos:pos + 7])
+
+    assert chk.digest() == checksum(pkt, 'cp1250')
+
+
+def test_fast_codec_matches_registry():
+    for encoding in ('mazovia', 'cp1250'):
+        for txt in ('Test 1;2/3\r', 'Zażółć gęślą jaźń ĄŚĆŁÓŚŹŻ'):
+            assert encoder(encoding)(txt) == txt.encode(encoding)
+            assert decoder(encoding)(txt.encode(encoding)) == txt
+
+
+def test_mazovia_codec_registered_under_its_name_only():
+    assert codecs.lookup('mazovia').name == 'mazovia'
+
+    with pytest.raises(LookupError):
+        codecs.lookup('no-such-encoding')
+
+
+def test_frame_decoder():
+    decoder = FrameDecoder()
+
+    assert decoder.feed(b'\x00noise\x1bP1#E') == []
+    assert decoder.feed(b'0\x1b\\\x1bP1#E1') == [b'\x1bP1#E0\x1b\\']
+    # restart on a new frame inside an unterminated one
+    assert decoder.feed(b'\x1bP1#E2\x1b') == []
+    assert decoder.feed(b'\\') == [b'\x1bP1#E2\x1b\\']
+
+
+def test_verify_frame():
+    frame = assemble_packet('#i', ['0'], ['100/'], 'cp1250')
+
+    assert verify_frame(frame)
+    assert not verify_frame(frame.replace(b'100', b'101'))
+
+
+def test_cash_register_data_fields():
+    data = parse_cash_register_data_reply(
+        b'2#X0;1;0;1;1;0;20;07;23/23.00/08.00/05.00/00.00/100.00/101.00/101.00/169/810.19/0.00/0.00/0.00/0.00/0.00/0.00/0.00/ABC1234567890F1'
+    )
+
+    assert data['serialno'] == b'ABC1234567890'
+    assert data['zeroingcount'] == b'0'
+    assert data.fiscal and not data.intransaction and data.lasttransactionerror
+    assert data.date == date(2020, 7, 23)
+    assert data.receiptcount == 169
+    assert data.tax_rates['B'] == Decimal('8.00')
+    assert data.totals['A'] == Decimal('810.19')
+    assert dict(data.items())['PTU_G'] == b'101.00'
+    assert data == dict(data)
+    assert list(data.values())[-1] == b'ABC1234567890'
+    assert data.get('missing') is None
+
+
+def test_registered_reply_layout():
+    register_reply(b'9#T', 'mode;-;count/name', {'count': int})
+    try:
+        reply = parse_reply(b'9#T1;x;42/Test')
+        assert reply.count == 42
+        assert reply['name'] == b'Test'
+        assert parse_reply(b'8#T1;2/3', strict=False).fields == [[b'1', b'2'], [b'3']]
+    finally:
+        del REPLY_TYPES[b'9#T']
+
+
+def test_nmb_rounds_half_up():
+    assert nmb(2.675) == '2.68'
+    assert nmb(1.005) == '1.01'
+    assert nmb(Decimal('2.345')) == '2.35'
+    assert nmb(0.1 + 0.2) == '0.30'
+    assert nmb(3) == '3.00'
+
+
+def test_item_value_uses_sent_amounts():
+    # 1.15 * 3 is 3.4499999999999997 in float
+    assert item_value(1.15, 3) == Decimal('3.45')
+    assert item_value('4.99', '0.333') == Decimal('1.65')
@@ -0,0 +1,52 @@
+import unicodedata
+
+
+import pytest
+
+
+from litex.novitus.layout import Layout, printable, wrap, fit_widths
+
+
+def test_printable():
+    decomposed = unicodedata.normalize('NFD', 'Zażółć gęślą jaźń')
+
+    assert printable(decomposed) == 'Zażółć gęślą jaźń'
+    assert printable('Dvořák 5€', 'mazovia') == 'Dvorak 5?'
+    assert printable('Dvořák 5€', 'cp1250') == 'Dvořák 5€'
+
+
+def test_wrap():
+    assert wrap('Zażółć gęślą jaźń', 10) == ('Zażółć', 'gęślą jaźń')
+    assert wrap('a\n\nb', 10) == ('a', '', 'b')
+    assert wrap('x' * 12, 5) == ('xxxxx', 'xxxxx', 'xx')
+
+
+def test_text_alignment():
+    layout = Layout(widths={0: 10})
+
+    assert layout.text('Źdźbło', align='^') == ['  Źdźbło']
+    assert layout.text('Źdźbło', align='>') == ['    Źdźbło']
+    assert layout.rule() == '-' * 10
+
+
+def test_fit_widths():
+    assert fit_widths([30, 6, 8], 40) == [24, 6, 8]
+    assert sum(fit_widths([20, 20, 20], 40)) + 2 == 40
+
+    with pytest.raises(ValueError):
+        fit_widths([1, 1, 1], 3)
+
+
+def test_table():
+    layout = Layout(widths={0: 20})
+    lines = layout.table(
+        [('Chleb żytni razowy', 2, '7.98'), ('Masło', 1, '6.49')],
+        aligns='<>>',
+        header=('Towar', 'Ilość', 'Wartość')
+    )
+
+    assert all(len(line) <= 20 for line in lines)
+    assert lines[1] == '-' * 20
+    assert lines[2].endswith('2    7.98')
+    assert lines[3:5] == ['żytni', 'razowy']
+    assert lines[5].startswith('Masło')
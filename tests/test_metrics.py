@@ -0,0 +1,65 @@
+import urllib.request
+
+
+import pytest
+
+
+from litex.novitus.exceptions import CommunicationTimeout, ProtocolError
+from litex.novitus.metrics import Metrics
+
+
+@pytest.fixture
+def metrics(fake_printer):
+    metrics = Metrics()
+    metrics.attach(fake_printer, 'lane1')
+    return metrics
+
+
+def test_commands_and_errors(fake_printer, metrics):
+    fake_printer.conn.fail = lambda pkt: 21 if pkt.startswith(b'\x1bP0$e') else 0
+
+    fake_printer.open_drawer()
+    with pytest.raises(ProtocolError):
+        fake_printer.receipt_cancel()
+
+    assert metrics.commands[('lane1', '$d')] == 1
+    assert metrics.commands[('lane1', '$e')] == 1
+    assert metrics.latency[('lane1', '$e')].count == 1
+    assert metrics.protocol_errors == {('lane1', 21): 1}
+
+    text = metrics.render()
+    assert 'novitus_commands_total{printer="lane1",command="$d"} 1' in text
+    assert 'novitus_command_duration_seconds_bucket{printer="lane1",command="$e",le="+Inf"} 1' in text
+    assert (
+        'novitus_protocol_errors_total{printer="lane1",code="21",'
+        'message="Paragon nie został rozpoczęty"} 1'
+    ) in text
+    assert 'novitus_reconnects_total{printer="lane1"} 0' in text
+
+
+def test_paper_errors_and_timeouts(fake_printer, metrics):
+    fake_printer.conn.dle_status = b'\x06'
+    fake_printer.dle()
+
+    fake_printer.status_backoff = ()
+    fake_printer.conn.handle_control = lambda ctrl: None
+    with pytest.raises(CommunicationTimeout):
+        fake_printer.receipt_cancel()
+
+    assert metrics.paper_errors['lane1'] == 1
+    # counted once, although both ENQ and $e failed with it
+    assert metrics.timeouts['lane1'] == 1
+
+
+def test_http_endpoint(fake_printer, metrics):
+    fake_printer.open_drawer()
+
+    server = metrics.serve(port=0)
+    try:
+        with urllib.request.urlopen(
+            'http://127.0.0.1:{}/metrics'.format(server.server_address[1])
+        ) as response:
+            assert response.headers['Content-Type'].startswith('text/plain')
+            assert b'novitus_commands_total{printer="lane1",command="$d"} 1' in response.read()
+    finally:
+        server.shutdown()
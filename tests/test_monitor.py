@@ -0,0 +1,59 @@
+import threading
+
+
+from litex.novitus.monitor import StatusMonitor
+
+
+def test_sample_and_events(fake_printer):
+    events = []
+    monitor = StatusMonitor(fake_printer, stuck_after=0)
+    monitor.subscribe(lambda event, status: events.append(event))
+
+    status = monitor.sample()
+    assert status is monitor.status
+    assert status.reachable and status.online == 'yes' and status.fiscal == 'yes'
+    assert events == ['reachable', 'online']
+
+    fake_printer.conn.dle_status = b'\x06'
+    fake_printer.conn.in_transaction = True
+    monitor.sample()
+    monitor.sample()
+    assert events[2:] == ['paper_out', 'stuck_in_transaction']
+
+    fake_printer.conn.dle_status = b'\x04'
+    fake_printer.conn.in_transaction = False
+    monitor.sample()
+    assert events[4:] == ['paper_ok', 'transaction_closed']
+
+
+def test_busy_printer_is_not_sampled(fake_printer):
+    monitor = StatusMonitor(fake_printer)
+    acquired = threading.Event()
+    release = threading.Event()
+
+    def busy():
+        with fake_printer.lock:
+            acquired.set()
+            release.wait()
+
+    thread = threading.Thread(target=busy)
+    thread.start()
+    acquired.wait()
+    try:
+        assert not monitor.sample().reachable
+        assert fake_printer.conn.written == []
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_unreachable(fake_printer):
+    events = []
+    monitor = StatusMonitor(fake_printer)
+    monitor.subscribe(lambda event, status: events.append(event))
+    monitor.sample()
+
+    fake_printer.status_backoff = ()
+    fake_printer.conn.handle_control = lambda ctrl: None
+    assert not monitor.sample().reachable
+    assert events[-1] == 'unreachable'
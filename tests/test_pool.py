@@ -0,0 +1,41 @@
+import threading
+
+
+from litex.novitus import PrinterPool
+from litex.novitus import pool
+
+
+def test_resolve_urls(monkeypatch):
+    class Port:
+        def __init__(self, device):
+            self.device = device
+
+    monkeypatch.setattr(
+        pool.list_ports, 'grep',
+        lambda pattern: [Port('/dev/ttyACM1'), Port('/dev/ttyACM0')]
+    )
+
+    assert pool.resolve_urls(['hwgrep://.*Novitus.*', 'socket://host:1', '/dev/ttyACM0']) == [
+        '/dev/ttyACM0', '/dev/ttyACM1', 'socket://host:1'
+    ]
+
+
+def test_jobs_routed_to_device(fake_printer_factory):
+    with PrinterPool(['loop://a', 'loop://b'], printer_factory=fake_printer_factory) as printers:
+        futures = [
+            printers.submit(lambda p: (p.url, threading.current_thread().name), device='loop://b')
+            for _ in range(5)
+        ]
+        results = {f.result(timeout=5) for f in futures}
+
+        assert results == {('loop://b', 'novitus-loop://b')}
+        assert printers.stats()['loop://b']['completed'] == 5
+
+
+def test_job_failure_propagates(fake_printer_factory):
+    with PrinterPool(['loop://a'], printer_factory=fake_printer_factory) as printers:
+        printers.workers['loop://a'].printer.conn.fail = lambda pkt: 21
+        future = printers.submit(lambda p: p.receipt_cancel())
+
+        assert future.exception(timeout=5).error_code == 21
+        assert printers.stats()['loop://a']['failed'] == 1
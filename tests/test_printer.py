@@ -0,0 +1,324 @@
+import threading
+
+
+import pytest
+
+
+from litex.novitus import printer as printer_module
+from litex.novitus.exceptions import CommunicationError, ProtocolError, BatchError
+from litex.novitus.helpers import assemble_packet
+from litex.novitus.printer import DeviceLock
+from litex.novitus.tracing import SpanHook
+
+
+def test_error_check_skips_error_query_when_flag_is_clear(fake_printer):
+    fake_printer.set_error('silent')
+    fake_printer.open_drawer()
+    fake_printer.receipt_cancel()
+
+    assert not any(pkt.startswith(b'\x1bP#n') for pkt in fake_printer.conn.written)
+
+
+def test_error_check_raises_protocol_error(fake_printer):
+    fake_printer.conn.fail = lambda pkt: 21
+
+    with pytest.raises(ProtocolError) as exc:
+        fake_printer.receipt_cancel()
+
+    assert exc.value.error_code == 21
+
+
+def test_latency_report(fake_printer):
+    fake_printer.receipt_cancel()
+    fake_printer.receipt_cancel()
+
+    report = fake_printer.latency_report()
+
+    assert report['$e']['count'] == 2
+    assert report['$e']['max'] >= report['$e']['avg']
+
+
+def _receipt(printer, lines):
+    printer.receipt_begin()
+    for no in range(1, lines + 1):
+        printer.item(line_no=no, name='Item', quantity=1, ptu='A', price=1)
+    printer.receipt_close(lines, 'John Doe')
+
+
+def test_batch_defers_error_checks(fake_printer):
+    with fake_printer.batch():
+        _receipt(fake_printer, 10)
+
+    written = fake_printer.conn.written
+
+    assert written.count(b'\x05') == 12
+    assert not any(pkt.startswith(b'\x1bP#n') for pkt in written)
+    assert fake_printer.conn.in_waiting == 0
+
+
+def test_batch_pinpoints_failing_line(fake_printer):
+    fake_printer.conn.fail = lambda pkt: 19 if pkt.startswith(b'\x1bP4$l') else 0
+
+    with pytest.raises(BatchError) as exc:
+        with fake_printer.batch():
+            _receipt(fake_printer, 10)
+
+    assert exc.value.error_code == 19
+    assert exc.value.index == 4
+    assert exc.value.command == '$l'
+
+
+def test_checkpoint_outside_batch(fake_printer):
+    fake_printer.checkpoint()
+    fake_printer.conn.fail = lambda pkt: 19
+
+    with pytest.raises(ProtocolError):
+        fake_printer.item(line_no=1, name='Item', quantity=1, ptu='A', price=1)
+
+
+@pytest.mark.parametrize('request_status', ['dle', 'enq', 'check_for_errors'])
+def test_status_request_checkpoints_batch(fake_printer, request_status):
+    fake_printer.conn.fail = lambda pkt: 19 if pkt.startswith(b'\x1bP2$l') else 0
+
+    with pytest.raises(BatchError) as exc:
+        with fake_printer.batch():
+            fake_printer.receipt_begin()
+            for no in range(1, 4):
+                fake_printer.item(line_no=no, name='Item', quantity=1, ptu='A', price=1)
+            getattr(fake_printer, request_status)()
+
+    assert exc.value.index == 2
+
+
+def test_reconnect_reuses_resolved_port(monkeypatch, fake_connection_factory):
+    resolved = []
+    opened = []
+
+    def resolve_port(url):
+        resolved.append(url)
+        return '/dev/ttyACM0'
+
+    def serial_for_url(port):
+        opened.append(port)
+        return fake_connection_factory()
+
+    monkeypatch.setattr(printer_module, 'resolve_port', resolve_port)
+    monkeypatch.setattr(printer_module.serial, 'serial_for_url', serial_for_url)
+
+    printer = printer_module.Printer('hwgrep://.*Novitus.*', reconnect_backoff=(0,))
+    printer.receipt_cancel()
+    printer.reconnect()
+    printer.receipt_cancel()
+
+    assert resolved == ['hwgrep://.*Novitus.*']
+    assert opened == ['/dev/ttyACM0', '/dev/ttyACM0']
+    assert printer.reconnects == 1
+
+
+def test_dead_link_is_dropped(fake_printer, fake_connection_factory):
+    def write(data):
+        raise OSError('device disconnected')
+
+    fake_printer.health_check_interval = None
+    fake_printer.conn.write = write
+
+    with pytest.raises(CommunicationError):
+        fake_printer.receipt_cancel()
+
+    assert fake_printer._conn is None
+
+    # reopened lazily by the next command
+    fake_printer._conn = fake_connection_factory()
+    fake_printer.receipt_cancel()
+
+    assert fake_printer.reconnects == 1
+
+
+def test_idle_link_is_probed(fake_printer):
+    fake_printer.health_check_interval = 0
+    fake_printer.receipt_cancel()
+
+    assert fake_printer.conn.written[0] == b'\x10'
+
+
+def test_stale_input_is_drained(fake_printer):
+    fake_printer.conn._buffer += b'\x1bP1#E99\x1b\\\x08'
+
+    assert fake_printer.get_error() == 0
+
+
+def test_hooks_receive_traces(fake_printer):
+    traces = []
+    fake_printer.hooks.append(traces.append)
+    fake_printer.conn.fail = lambda pkt: 21 if pkt.startswith(b'\x1bP0$e') else 0
+
+    with pytest.raises(ProtocolError):
+        fake_printer.receipt_cancel()
+
+    commands = [trace.command for trace in traces]
+    assert commands == ['ENQ', '#n', '$e']
+
+    trace = traces[-1]
+    assert trace.error_code == 21
+    assert trace.written == len(assemble_packet('$e', ['0']))
+    assert trace.check_time is not None
+    assert trace.duration >= trace.write_time + trace.reply_time
+
+
+def test_failing_hook_does_not_break_commands(fake_printer):
+    def hook(trace):
+        raise RuntimeError
+
+    fake_printer.hooks.append(hook)
+    fake_printer.receipt_cancel()
+
+
+def test_span_hook(fake_printer):
+    class Span:
+        def __init__(self, name, start_time, attributes):
+            self.name = name
+            self.start_time = start_time
+            self.attributes = attributes
+
+        def record_exception(self, exc):
+            pass
+
+        def end(self, end_time):
+            self.end_time = end_time
+
+    spans = []
+
+    class Tracer:
+        def start_span(self, name, start_time, attributes):
+            spans.append(Span(name, start_time, attributes))
+            return spans[-1]
+
+    fake_printer.hooks.append(SpanHook(Tracer()))
+    fake_printer.open_drawer()
+
+    assert [span.name for span in spans] == ['novitus $d']
+    assert spans[0].attributes['novitus.written'] > 0
+    assert spans[0].end_time >= spans[0].start_time
+
+
+def test_device_lock_owner():
+    lock = DeviceLock()
+    seen = []
+
+    with lock:
+        with lock:
+            assert lock.owned()
+        assert lock.owned()
+
+        thread = threading.Thread(target=lambda: seen.append((lock.owned(), lock.acquire(False))))
+        thread.start()
+        thread.join()
+
+    assert not lock.owned()
+    assert seen == [(False, False)]
+
+
+def test_flight_ends_before_lock_release(fake_printer):
+    release = fake_printer.lock.release
+    flights = []
+
+    def spy():
+        flights.append(dict(fake_printer._flights))
+        release()
+
+    fake_printer.lock.release = spy
+    fake_printer.enq()
+
+    assert 'ENQ' in flights[0]
+    assert flights[-1] == {}
+
+
+def test_metadata_cache(emulated_printer, emulator):
+    assert emulated_printer.taxrates_get()[0] == ('A', '23.00%')
+    packets = emulator.packets
+
+    assert emulated_printer.taxrates_get()[0] == ('A', '23.00%')
+    assert emulated_printer.metadata()['serialno'] == emulator.serialno
+    assert emulator.packets == packets
+
+    # an unknown command (e.g. a daily report) might change the metadata
+    emulated_printer.send_command('#r')
+    emulated_printer.metadata()
+    assert emulator.packets == packets + 2
+
+    emulated_printer.metadata_ttl = 0
+    emulated_printer.taxrates_get()
+    assert emulator.packets == packets + 3
+
+
+def test_concurrent_commands(emulated_printer, emulator):
+    emulator.latency['default'] = 0.002
+    errors = []
+
+    def run(fn):
+        try:
+            for _ in range(10):
+                fn()
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [
+        threading.Thread(target=run, args=(fn,))
+        for fn in (emulated_printer.receipt_cancel, emulated_printer.enq, emulated_printer.dle) * 3
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    # every cancel is followed by its own ENQ, and an error query never ran
+    assert emulator.packets == 30
+
+
+def test_identical_queries_are_coalesced(emulated_printer, emulator):
+    emulator.latency['#s'] = 0.1
+    commands = []
+    emulated_printer.hooks.append(lambda trace: commands.append(trace.command))
+    barrier = threading.Barrier(5)
+    results = []
+
+    def query():
+        barrier.wait()
+        results.append(emulated_printer.cash_register_data(mode=22))
+
+    threads = [threading.Thread(target=query) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 5
+    assert commands.count('#s') < 5
+    assert all(data.serialno == 'ABC1234567890' for data in results)
+
+
+def test_streamed_printout(emulated_printer, emulator):
+    def lines():
+        for line_no in range(1000):
+            yield 'Line {} zażółć'.format(line_no)
+
+    emulated_printer.non_fiscal_printout(lines(), printout_no=200, line_no=1, chunk_lines=64)
+
+    # begin, close and 1000 lines, with no error queries
+    assert emulator.packets == 1002
+
+
+def test_streamed_printout_error(emulated_printer, emulator):
+    emulator.errors['$w'] = lambda body: 4 if b'Line 70\r' in body else 0
+
+    with pytest.raises(ProtocolError) as exc:
+        emulated_printer.non_fiscal_printout(
+            ('Line {}'.format(line_no) for line_no in range(100)),
+            printout_no=200,
+            line_no=1,
+            chunk_lines=32
+        )
+
+    assert exc.value.error_code == 4
+    assert exc.value.index == 70
@@ -0,0 +1,203 @@
+from decimal import Decimal
+
+
+import pytest
+
+
+from litex.novitus import Receipt, Invoice, assemble_packet
+from litex.novitus.exceptions import CommunicationError
+from litex.novitus.receipt import Transaction
+
+
+def _receipt():
+    return Receipt(system_identifier='2/TEST/2020').item(
+        name='Test discount',
+        quantity=2,
+        ptu='A',
+        price=4,
+        discount_name='Promotion',
+        discount_value='10%',
+        discount_descid=2
+    ).item(
+        name='Test zażółć gęślą jaźń 2',
+        quantity=4,
+        ptu='A',
+        price=2
+    ).discount(
+        value='20%',
+        name='Employee'
+    )
+
+
+def test_receipt_total():
+    assert _receipt().total == Decimal('15.20')
+
+
+def test_receipt_total_mismatch():
+    with pytest.raises(ValueError):
+        _receipt().close(cashier='John Doe', total=16)
+
+
+def test_receipt_render():
+    receipt = _receipt().close(cashier='John Doe', discount=20, cash=50)
+    buf, frames = receipt.render('cp1250')
+
+    assert [command for command, _, _ in frames] == ['$h', '$l', '$l', '$n', '$e']
+    assert bytes(buf) == b''.join(
+        assemble_packet(cmd.command, cmd.parameters, cmd.texts, 'cp1250')
+        for cmd in receipt.commands()
+    )
+
+
+def test_transaction_needs_begin_command():
+    with pytest.raises(TypeError):
+        Transaction()
+
+
+def test_invoice_lines_count():
+    invoice = Invoice(
+        customer='Litex Service Sp. z o.o.',
+        nip='6220006775',
+        number='FV 1/2020'
+    ).item(name='Test', quantity=10, ptu='A', price=10).close()
+
+    assert invoice.commands()[0].parameters[0] == '1'
+    assert '100.00' in invoice.closing.texts
+
+
+def test_print_document(fake_printer):
+    fake_printer.print_document(_receipt().close(cashier='John Doe'))
+
+    written = fake_printer.conn.written
+
+    assert [pkt[2:] for pkt in written if pkt.startswith(b'\x1bP')][-1].startswith(b'1;0;0;1;1;1$e')
+    assert not any(pkt.startswith(b'\x1bP#n') for pkt in written)
+
+
+def _drop_link_after(conn, packets):
+    write = conn.write
+
+    def flaky_write(data):
+        if sum(pkt.startswith(b'\x1bP') for pkt in conn.written) >= packets:
+            raise OSError('device disconnected')
+        write(data)
+
+    conn.write = flaky_write
+    return write
+
+
+def test_resume_sends_only_missing_lines(fake_printer):
+    conn = fake_printer.conn
+    fake_printer.health_check_interval = None
+    receipt = _receipt().close(cashier='John Doe')
+    write = _drop_link_after(conn, 3)
+
+    with pytest.raises(CommunicationError):
+        fake_printer.print_document(receipt)
+
+    assert receipt.sent == 3
+    conn.write = write
+    fake_printer._conn = conn
+    fake_printer.resume_document(receipt)
+
+    packets = [pkt for pkt in conn.written if pkt.startswith(b'\x1bP')]
+    assert [pkt.split(b'$')[1][:1] for pkt in packets] == [b'h', b'l', b'l', b'n', b'e']
+    assert receipt.confirmed == 5
+    assert not conn.in_transaction
+
+
+def test_resume_after_failed_packet_write(fake_printer):
+    conn = fake_printer.conn
+    fake_printer.health_check_interval = None
+    receipt = _receipt().close(cashier='John Doe')
+    write = conn.write
+
+    def flaky_write(data):
+        if b'$n' in bytes(data):
+            raise OSError('device disconnected')
+        write(data)
+
+    conn.write = flaky_write
+
+    with pytest.raises(CommunicationError):
+        fake_printer.print_document(receipt)
+
+    assert receipt.sent == 3
+    conn.write = write
+    fake_printer._conn = conn
+    fake_printer.resume_document(receipt)
+
+    packets = [pkt for pkt in conn.written if pkt.startswith(b'\x1bP')]
+    assert [pkt.split(b'$')[1][:1] for pkt in packets] == [b'h', b'l', b'l', b'n', b'e']
+    assert receipt.confirmed == 5
+
+
+def test_resume_cancels_after_unconfirmed_error(fake_printer):
+    conn = fake_printer.conn
+    fake_printer.health_check_interval = None
+    receipt = _receipt().close(cashier='John Doe')
+    conn.fail = lambda pkt: 4 if 'jaźń'.encode('cp1250') in pkt else 0
+    write = _drop_link_after(conn, 3)
+
+    with pytest.raises(CommunicationError):
+        fake_printer.print_document(receipt)
+
+    assert (receipt.sent, receipt.confirmed) == (3, 0)
+    conn.fail = lambda pkt: 0
+    conn.write = write
+    fake_printer._conn = conn
+    fake_printer.resume_document(receipt)
+
+    packets = [pkt for pkt in conn.written if pkt.startswith(b'\x1bP') and b'#' not in pkt]
+    assert [pkt.split(b'$')[1][:1] for pkt in packets] == [
+        b'h', b'l', b'l', b'e', b'h', b'l', b'l', b'n', b'e'
+    ]
+    assert receipt.confirmed == 5
+    assert not conn.in_transaction
+
+
+def test_checkpoint_confirms_packets(fake_printer):
+    conn = fake_printer.conn
+    fake_printer.health_check_interval = None
+    receipt = _receipt().close(cashier='John Doe')
+    write = _drop_link_after(conn, 4)
+
+    with pytest.raises(CommunicationError):
+        fake_printer.print_document(receipt)
+
+    # the $e checkpoint read the statuses of $h $l $l $n
+    assert (receipt.sent, receipt.confirmed) == (4, 4)
+    conn.write = write
+    fake_printer._conn = conn
+    fake_printer.resume_document(receipt)
+
+    packets = [pkt for pkt in conn.written if pkt.startswith(b'\x1bP')]
+    assert [pkt.split(b'$')[1][:1] for pkt in packets] == [b'h', b'l', b'l', b'n', b'e']
+
+
+def test_resume_complete_transaction(fake_printer):
+    receipt = _receipt().close(cashier='John Doe')
+    fake_printer.print_document(receipt)
+    written = len(fake_printer.conn.written)
+
+    fake_printer.resume_document(receipt)
+
+    assert not any(
+        pkt.startswith(b'\x1bP') for pkt in fake_printer.conn.written[written:]
+    )
+
+
+def test_receipt_total_is_exact():
+    receipt = Receipt()
+    for _ in range(10):
+        receipt.item(name='Test', quantity=1, ptu='A', price=0.1)
+
+    receipt.close(cashier='John Doe', total=1)
+
+    assert receipt.total == Decimal('1.00')
+    assert b'\r0.00/1.00/0.00/' in receipt.render('cp1250')[0]
+
+
+def test_receipt_close_takes_keywords():
+    with pytest.raises(TypeError):
+        _receipt().close(15.20, 'John Doe')
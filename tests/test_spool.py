@@ -0,0 +1,126 @@
+import json
+
+
+import pytest
+
+
+from litex.novitus import Receipt
+from litex.novitus.spool import Spool, Dispatcher, CONFIRMED, FAILED, SENT
+
+
+def _receipt(price=4):
+    return Receipt().item(name='Test', quantity=2, ptu='A', price=price).close(cashier='John Doe')
+
+
+def test_jobs_are_printed_and_confirmed(tmp_path, emulated_printer, emulator):
+    with Spool(str(tmp_path / 'journal')) as spool:
+        ids = [spool.submit(_receipt()) for _ in range(3)]
+
+        dispatcher = Dispatcher(spool, emulated_printer)
+        dispatcher.start()
+        try:
+            assert [spool.wait(job_id, timeout=5) for job_id in ids] == [CONFIRMED] * 3
+        finally:
+            dispatcher.stop()
+
+    assert emulator.receipt_count == 3
+
+
+def test_resubmitted_job_is_not_queued_twice(tmp_path):
+    with Spool(str(tmp_path / 'journal')) as spool:
+        spool.submit(_receipt(), job_id='order-1')
+        spool.submit(_receipt(), job_id='order-1')
+
+        assert len(spool.pending()) == 1
+
+
+def test_rejected_job_fails(tmp_path, emulated_printer, emulator):
+    emulator.errors['$l'] = 19
+
+    with Spool(str(tmp_path / 'journal')) as spool:
+        job_id = spool.submit(_receipt())
+        job = spool.next_job()
+        Dispatcher(spool, emulated_printer).dispatch(job)
+
+        assert job.state == FAILED
+        assert job.error_code == 19
+        assert not emulator.in_transaction
+
+
+@pytest.mark.parametrize('printed', [True, False])
+def test_recovery_after_crash(tmp_path, emulated_printer, emulator, printed):
+    path = str(tmp_path / 'journal')
+
+    with Spool(path) as spool:
+        job_id = spool.submit(_receipt())
+        spool.set_state(spool.jobs[job_id], SENT, receiptcount=0)
+
+    if printed:
+        emulator.receipt_count = 1
+
+    with Spool(path) as spool:
+        job = spool.jobs[job_id]
+        assert job.state == SENT
+
+        Dispatcher(spool, emulated_printer).dispatch(job)
+
+        assert job.state == CONFIRMED
+
+    assert emulator.receipt_count == 1
+
+
+def test_torn_record_is_truncated(tmp_path):
+    path = str(tmp_path / 'journal')
+
+    with Spool(path) as spool:
+        job_id = spool.submit(_receipt())
+
+    with open(path, 'ab') as journal:
+        journal.write(b'{"job":"x","sta')
+
+    with Spool(path) as spool:
+        assert list(spool.jobs) == [job_id]
+        spool.submit(_receipt(), job_id='next')
+
+    with Spool(path) as spool:
+        assert list(spool.jobs) == [job_id, 'next']
+
+
+def test_record_without_line_end_is_kept(tmp_path):
+    path = str(tmp_path / 'journal')
+
+    with Spool(path) as spool:
+        spool.submit(_receipt(), job_id='a')
+
+    with open(path, 'r+b') as journal:
+        journal.truncate(len(journal.read()) - 1)
+
+    with Spool(path) as spool:
+        assert list(spool.jobs) == ['a']
+        spool.submit(_receipt(), job_id='b')
+
+    with Spool(path) as spool:
+        assert list(spool.jobs) == ['a', 'b']
+
+
+def test_compaction(tmp_path):
+    path = str(tmp_path / 'journal')
+
+    with Spool(path, compact_threshold=2) as spool:
+        first, second, third = (spool.submit(_receipt()) for _ in range(3))
+        spool.set_state(spool.jobs[first], CONFIRMED)
+        spool.set_state(spool.jobs[second], FAILED, error_code=19)
+
+        assert list(spool.jobs) == [third]
+        assert spool.wait(first) == CONFIRMED
+        assert spool.submit(_receipt(), job_id=first) == first
+        assert list(spool.jobs) == [third]
+
+    with open(path, 'rb') as journal:
+        assert [json.loads(line)['job'] for line in journal] == [first, second, third]
+
+    with Spool(path) as spool:
+        assert spool.done == {first: CONFIRMED, second: FAILED}
+        assert spool.wait(second) == FAILED
+        spool.submit(_receipt(), job_id=second)
+        assert list(spool.jobs) == [third]
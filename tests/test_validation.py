@@ -0,0 +1,90 @@
+import pytest
+
+
+from litex.novitus import Receipt, ValidationError, parse_cash_register_data_reply
+from litex.novitus import validation
+
+
+@pytest.mark.parametrize('kwargs, code', [
+    ({'name': ''}, 16),
+    ({'name': 'x' * 41}, 16),
+    ({'name': 'Test €'}, 16),
+    ({'quantity': 0}, 17),
+    ({'quantity': 0.001}, 17),
+    ({'ptu': 'H'}, 18),
+    ({'price': 0}, 19),
+    ({'price': float('nan')}, 19),
+    ({'quantity': 'inf'}, 17),
+    ({'price': 0.4, 'quantity': 0.01}, 20),
+    ({'discount_value': '100%'}, 20),
+    ({'discount_value': 'NaN%'}, 20),
+])
+def test_item(kwargs, code):
+    args = dict(line_no=1, name='Test zażółć', quantity=1, ptu='A', price=10)
+    args.update(kwargs)
+
+    with pytest.raises(ValidationError) as exc:
+        validation.item(encoding='mazovia', **args)
+
+    assert exc.value.error_code == code
+
+
+def test_item_unused_ptu():
+    taxrates = [('A', '23.00%'), ('G', 'unused')]
+
+    validation.item(1, 'Test', 1, 'A', 10, taxrates=taxrates)
+
+    with pytest.raises(ValidationError) as exc:
+        validation.item(1, 'Test', 1, 'G', 10, taxrates=taxrates)
+
+    assert exc.value.field == 'ptu'
+
+
+def test_cached_taxrates_expire(fake_printer):
+    fake_printer._update_metadata(parse_cash_register_data_reply(
+        b'2#X0;1;0;1;1;0;20;07;23/23.00/08.00/05.00/00.00/100.00/101.00/101.00/169/810.19/0.00/0.00/0.00/0.00/0.00/0.00/0.00/ABC1234567890F1'
+    ))
+    assert fake_printer._cached_taxrates()[0] == ('A', '23.00%')
+
+    fake_printer.metadata_ttl = -1
+    assert fake_printer._cached_taxrates() is None
+
+
+def test_printer_fails_before_sending(fake_printer):
+    with pytest.raises(ValidationError):
+        fake_printer.item(1, 'Test', 1, 'A', -5)
+
+    with pytest.raises(ValidationError):
+        fake_printer.payment_add('cash', 0)
+
+    assert fake_printer.conn.written == []
+
+
+def test_receipt_builder():
+    receipt = Receipt()
+
+    with pytest.raises(ValueError):
+        receipt.item('Test', -1, 'A', 10)
+
+    receipt.item('Test', 1, 'A', 10)
+
+    with pytest.raises(ValidationError) as exc:
+        receipt.close(cashier='John Doe', total=11)
+
+    assert exc.value.error_code == 27
+
+
+def test_printer_checks_transaction_total(fake_printer):
+    fake_printer.receipt_begin()
+    fake_printer.item(line_no=1, name='Item', quantity=3, ptu='A', price=0.1)
+    fake_printer.item(line_no=2, name='Item', quantity=1, ptu='A', price=4, discount_value='10%')
+    written = len(fake_printer.conn.written)
+
+    with pytest.raises(ValidationError) as exc:
+        fake_printer.receipt_close(4, 'John Doe')
+
+    assert exc.value.field == 'total'
+    assert len(fake_printer.conn.written) == written
+
+    fake_printer.receipt_close('3.90', 'John Doe')
+    assert fake_printer.totals is None